@@ -0,0 +1,104 @@
+"""Track cold-start time of each agent entry point.
+
+For each entry point this runs `python -X importtime -c "import <module>"`
+and reports the cumulative import time of the module. It also times the
+script's usage error (or `--help`) path, which is what a user pays for a
+mistyped command.
+
+Run from the repository root:
+
+    python benchmarks/importtime.py --runs 5 --json importtime.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+from typing import Dict, List
+
+
+repo_dir = Path(__file__).resolve().parent.parent
+
+# (project directory, module, arguments that exit early with a usage message)
+entry_points = [
+    ("pydantic-ai-weather", "weather_agent", []),
+    ("pydantic-ai-ollama", "ollama_example", []),
+    ("langgraph-openai-chatbot", "chatbot", ["--help"]),
+    ("crawl4ai-rag", "pydantic_ai_expert", None),
+]
+
+
+def import_time_us(project_dir: Path, module: str) -> int:
+    """Return the cumulative import time of a module in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=project_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # Lines look like: "import time:       123 |        456 | module"
+    for line in reversed(result.stderr.splitlines()):
+        parts = [part.strip() for part in line.removeprefix("import time:").split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def usage_time_s(project_dir: Path, module: str, args: List[str]) -> float:
+    """Return the wall time of running the script until it exits with a usage message."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, f"{module}.py", *args],
+        cwd=project_dir,
+        capture_output=True,
+        stdin=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold-start time of each agent entry point.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per entry point. The median is reported.")
+    parser.add_argument("--json", help="Also write results to this JSON file.")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'entry point':<45} {'import (ms)':>12} {'usage exit (ms)':>16}")
+    for project, module, usage_args in entry_points:
+        project_dir = repo_dir / project
+        name = f"{project}/{module}.py"
+        try:
+            import_ms = statistics.median(import_time_us(project_dir, module) for _ in range(args.runs)) / 1000
+        except RuntimeError as e:
+            print(f"{name:<45} failed: {e}")
+            continue
+
+        usage_ms = None
+        if usage_args is not None:
+            usage_ms = statistics.median(
+                usage_time_s(project_dir, module, usage_args) for _ in range(args.runs)
+            ) * 1000
+
+        results[name] = {"import_ms": import_ms, "usage_exit_ms": usage_ms}
+        usage_text = f"{usage_ms:>16.1f}" if usage_ms is not None else f"{'-':>16}"
+        print(f"{name:<45} {import_ms:>12.1f} {usage_text}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"python": sys.version.split()[0], "platform": sys.platform, "cpus": os.cpu_count(), "results": results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
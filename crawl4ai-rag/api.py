@@ -0,0 +1,271 @@
+"""HTTP API for the Pydantic AI expert.
+
+    POST   /conversations/{conversation_id}/messages   {"prompt": "..."}
+           Streams the reply as server-sent events:
+               event: delta   data: {"text": "..."}     (repeated)
+               event: done    data: {"usage": {...}}
+               event: error   data: {"error": "..."}
+    GET    /conversations/{conversation_id}   the conversation's messages
+    DELETE /conversations/{conversation_id}
+    GET    /health                            load and rejection counts
+    GET    /metrics                           Prometheus metrics
+
+Conversations are kept server side (see sessions.py). The X-Tenant-ID
+header scopes conversations and concurrency limits to a tenant. When a
+tenant or the whole process is at capacity, requests are turned away with
+429 or 503 and a Retry-After header (see limits.py).
+
+The OpenAI and Supabase clients are created once per process and shared by
+every request. Run it with uvicorn:
+
+    uvicorn api:app --port 8000
+
+The concurrency limits and the one-turn-at-a-time check for a conversation
+are kept in the process's memory, so they apply per process. Several
+processes (uvicorn --workers, or several servers) each allow the configured
+limits, so divide them by the number of processes, and they need
+SESSION_STORE="supabase" to share conversations. If two processes run a turn
+on the same conversation at once, the store keeps the first turn saved and
+the other ends with an error event instead of overwriting it.
+"""
+
+import contextlib
+import json
+import os
+import re
+import time
+
+from dotenv import load_dotenv
+from limits import Rejected, TenantLimiter
+from pydantic_ai_expert import PydanticAIDeps, get_pydantic_ai_expert
+from sessions import ConversationChanged, get_session_store
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from telemetry import api_queue_seconds, api_rejections, api_turn_seconds, configure_telemetry, registry
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, TypedDict
+
+
+id_pattern = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+
+class ChatMessage(TypedDict):
+    """Format of messages sent to the browser/API."""
+
+    role: Literal['user', 'model']
+    timestamp: str
+    content: str
+
+
+def sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStream(StreamingResponse):
+    """A server-sent event stream that calls `on_close` however it ends.
+
+    The stream's generator never runs if the client disconnects before the
+    response starts, so cleanup can't live in the generator alone.
+    """
+
+    def __init__(self, content: AsyncIterator[str], on_close: Callable[[], None]):
+        super().__init__(
+            content,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+
+def error(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+def conversation_key(request: Request) -> str:
+    tenant = request.headers.get("x-tenant-id", "default")
+    conversation_id = request.path_params["conversation_id"]
+    if not id_pattern.match(tenant) or not id_pattern.match(conversation_id):
+        raise ValueError("Tenant and conversation ids must be 1-128 letters, digits, '.', '_' or '-'.")
+    return f"{tenant}/{conversation_id}"
+
+
+async def stream_turn(request: Request, key: str, prompt: str) -> AsyncIterator[str]:
+    """Run one agent turn on the conversation and stream the reply."""
+    from pydantic_ai.messages import ModelResponse, TextPart
+
+    state = request.app.state
+    deps = PydanticAIDeps(
+        openai_client=state.openai_client,
+        supabase_client=state.supabase_client,
+        embedding_provider=state.embedding_provider,
+    )
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        conversation = await state.sessions.get(key)
+        async with get_pydantic_ai_expert().run_stream(
+            prompt, deps=deps, message_history=conversation.messages
+        ) as result:
+            text = ""
+            async for delta in result.stream_text(delta=True):
+                text += delta
+                yield sse("delta", {"text": delta})
+
+            # With delta streaming, the final text response may not be in the messages.
+            messages = result.all_messages()
+            if not messages or not isinstance(messages[-1], ModelResponse):
+                messages.append(ModelResponse(parts=[TextPart(content=text)]))
+            await state.sessions.save(key, messages, conversation.version)
+            usage = result.usage()
+
+        outcome = "ok"
+        yield sse("done", {"usage": {
+            "requests": usage.requests,
+            "request_tokens": usage.request_tokens,
+            "response_tokens": usage.response_tokens,
+            "total_tokens": usage.total_tokens,
+        }})
+    except ConversationChanged:
+        yield sse("error", {"error": "Another reply was added to this conversation at the same time. Reload it and try again."})
+    except Exception as e:
+        print(f"Error in conversation {key}: {e}")
+        yield sse("error", {"error": str(e)})
+    finally:
+        # Also reached when the client disconnects and the stream is cancelled.
+        deps.page_cache.close()
+        api_turn_seconds.observe(time.perf_counter() - started, outcome=outcome)
+
+
+async def post_message(request: Request) -> Response:
+    state = request.app.state
+    try:
+        key = conversation_key(request)
+        body = await request.json()
+        prompt = body["prompt"]
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError("prompt must be a non-empty string.")
+    except (ValueError, KeyError, TypeError) as e:
+        return error(400, f"Bad request: {e}")
+
+    # One turn at a time per conversation in this process. Across processes, the
+    # session store refuses to save a turn over another one.
+    if key in state.busy:
+        return error(409, "A reply is already being generated for this conversation.")
+
+    tenant = key.split("/", 1)[0]
+    started = time.perf_counter()
+    try:
+        slot = await state.limiter.acquire(tenant)
+    except Rejected as e:
+        api_rejections.inc(reason=e.reason)
+        return error(e.status, f"Too busy: {e.reason}.", {"Retry-After": str(e.retry_after)})
+    api_queue_seconds.observe(time.perf_counter() - started)
+
+    # The conversation may have started a turn while this request waited.
+    if key in state.busy:
+        slot.release()
+        return error(409, "A reply is already being generated for this conversation.")
+    state.busy.add(key)
+
+    def on_close():
+        state.busy.discard(key)
+        slot.release()
+
+    return EventStream(stream_turn(request, key, prompt), on_close)
+
+
+async def get_conversation(request: Request) -> Response:
+    from pydantic_ai.messages import ModelRequest, ModelResponse
+
+    try:
+        key = conversation_key(request)
+    except ValueError as e:
+        return error(400, f"Bad request: {e}")
+
+    messages: List[ChatMessage] = []
+    conversation = await request.app.state.sessions.get(key)
+    for message in conversation.messages:
+        for part in message.parts:
+            if isinstance(message, ModelRequest) and part.part_kind == 'user-prompt':
+                messages.append({"role": "user", "timestamp": part.timestamp.isoformat(), "content": part.content})
+            elif isinstance(message, ModelResponse) and part.part_kind == 'text':
+                messages.append({"role": "model", "timestamp": message.timestamp.isoformat(), "content": part.content})
+    return JSONResponse({"messages": messages})
+
+
+async def delete_conversation(request: Request) -> Response:
+    try:
+        key = conversation_key(request)
+    except ValueError as e:
+        return error(400, f"Bad request: {e}")
+    if key in request.app.state.busy:
+        return error(409, "A reply is being generated for this conversation.")
+    await request.app.state.sessions.delete(key)
+    return Response(status_code=204)
+
+
+async def health(request: Request) -> Response:
+    return JSONResponse({"status": "ok", **request.app.state.limiter.status()})
+
+
+async def metrics(request: Request) -> Response:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    import httpx
+
+    from embeddings import get_embedding_provider
+    from openai import AsyncOpenAI
+    from supabase import Client
+
+    load_dotenv()
+    configure_telemetry("crawl4ai-rag-api")
+
+    # One connection pool for the process's embedding requests.
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("API_OPENAI_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("API_OPENAI_CONNECTIONS", "100")),
+        ),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    app.state.openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+    app.state.supabase_client = Client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    app.state.embedding_provider = get_embedding_provider(app.state.openai_client)
+    app.state.sessions = get_session_store(app.state.supabase_client)
+    app.state.limiter = TenantLimiter(
+        max_concurrent=int(os.getenv("API_MAX_CONCURRENT", "32")),
+        per_tenant=int(os.getenv("API_TENANT_CONCURRENCY", "4")),
+        max_queue=int(os.getenv("API_MAX_QUEUE", "64")),
+        per_tenant_queue=int(os.getenv("API_TENANT_QUEUE", "8")),
+        queue_timeout=float(os.getenv("API_QUEUE_TIMEOUT", "10")),
+    )
+    app.state.busy = set()
+
+    # Build the agent (and its model client, shared by every request) before the first request.
+    get_pydantic_ai_expert()
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/conversations/{conversation_id}/messages", post_message, methods=["POST"]),
+        Route("/conversations/{conversation_id}", get_conversation, methods=["GET"]),
+        Route("/conversations/{conversation_id}", delete_conversation, methods=["DELETE"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
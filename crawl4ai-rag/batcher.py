@@ -0,0 +1,68 @@
+"""Micro-batching of concurrent calls.
+
+Callers submit one item at a time. Items are collected for up to
+`max_wait` seconds, or until `batch_size` are waiting, and handled together
+with one call to `run_batch`. Embeddings (embeddings.py) and LLM titles
+and summaries (crawl_site_docs.py) are batched this way.
+"""
+
+import asyncio
+
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+class MicroBatcher(Generic[Item, Result]):
+    """Collects concurrently submitted items and handles them in batches.
+
+    `run_batch` takes a list of items and returns a result for each, in
+    order. If it raises, every caller in the batch gets the error.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Item]], Awaitable[List[Result]]],
+        batch_size: int,
+        max_wait: float,
+    ):
+        self.run_batch = run_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._waiting: List[Tuple[Item, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Item) -> Result:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiting.append((item, future))
+        if len(self._waiting) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._waiting = self._waiting, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Item, asyncio.Future]]):
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
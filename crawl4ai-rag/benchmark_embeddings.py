@@ -0,0 +1,113 @@
+"""Compare embedding providers on the crawled documentation.
+
+For each provider this embeds the stored chunks (throughput), times
+single queries one at a time with `embed_one` as a search does (latency),
+then uses each chunk's summary as a query and checks whether the chunk
+itself comes back (retrieval quality: recall@1, recall@5 and MRR).
+
+    python benchmark_embeddings.py --providers openai,local --limit 500
+
+The summaries were generated from the chunks they are matched against, so
+they share much of their wording. Recall and MRR are higher than they
+would be for real questions. Use them to compare providers, not as an
+absolute measure.
+"""
+
+import argparse
+import asyncio
+import numpy as np
+import os
+import time
+
+from dotenv import load_dotenv
+from embeddings import EmbeddingProvider, LocalEmbeddingProvider, OpenAIEmbeddingProvider
+from openai import AsyncOpenAI
+from supabase import create_client
+from typing import Dict, List
+
+
+def load_corpus(limit: int) -> List[Dict[str, str]]:
+    supabase_client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    result = supabase_client.from_("site_pages") \
+        .select("url, chunk_number, summary, content") \
+        .limit(limit) \
+        .execute()
+    return result.data
+
+
+def create_provider(name: str) -> EmbeddingProvider:
+    if name == "openai":
+        return OpenAIEmbeddingProvider(AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+    if name == "local":
+        return LocalEmbeddingProvider(model=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    raise ValueError(f"Unknown provider: {name}")
+
+
+def normalize(vectors: List[List[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+async def benchmark(provider: EmbeddingProvider, corpus: List[Dict[str, str]], latency_queries: int) -> Dict[str, float]:
+    contents = [doc["content"] for doc in corpus]
+    queries = [doc["summary"] for doc in corpus]
+
+    start = time.perf_counter()
+    documents = normalize(await provider.embed(contents))
+    embed_seconds = time.perf_counter() - start
+
+    # One query at a time, as the agent embeds a search query.
+    latencies = []
+    for query in queries[:latency_queries]:
+        start = time.perf_counter()
+        await provider.embed_one(query)
+        latencies.append(time.perf_counter() - start)
+
+    query_vectors = normalize(await provider.embed(queries))
+
+    # Rank every chunk for every query. The right answer for query i is chunk i.
+    scores = query_vectors @ documents.T
+    correct = scores[np.arange(len(corpus)), np.arange(len(corpus))]
+    ranks = (scores > correct[:, None]).sum(axis=1) + 1
+
+    return {
+        "dimensions": documents.shape[1],
+        "chunks_per_second": len(contents) / embed_seconds,
+        "query_latency_mean_ms": float(np.mean(latencies)) * 1000,
+        "query_latency_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "recall@1": float(np.mean(ranks <= 1)),
+        "recall@5": float(np.mean(ranks <= 5)),
+        "mrr": float(np.mean(1.0 / ranks)),
+    }
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compare embedding providers on the crawled documentation.")
+    parser.add_argument("--providers", default="openai,local", help="Comma-separated providers to compare.")
+    parser.add_argument("--limit", type=int, default=500, help="Number of chunks to use.")
+    parser.add_argument("--latency-queries", type=int, default=50, help="Number of single queries to time.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.limit)
+    print(f"Loaded {len(corpus)} chunks\n")
+
+    print(
+        f"{'provider':<10} {'dims':>6} {'chunks/s':>10} {'query ms':>9} {'p50 ms':>8} "
+        f"{'R@1':>6} {'R@5':>6} {'MRR':>6}"
+    )
+    for name in args.providers.split(","):
+        results = await benchmark(create_provider(name), corpus, args.latency_queries)
+        print(
+            f"{name:<10} {results['dimensions']:>6} {results['chunks_per_second']:>10.1f} "
+            f"{results['query_latency_mean_ms']:>9.1f} {results['query_latency_p50_ms']:>8.1f} "
+            f"{results['recall@1']:>6.2f} {results['recall@5']:>6.2f} {results['mrr']:>6.2f}"
+        )
+    print(
+        "\nQuery ms is the mean time to embed one query on its own. The queries are the"
+        "\nchunks' own generated summaries, so R@1, R@5 and MRR overstate real-world recall."
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
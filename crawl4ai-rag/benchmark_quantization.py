@@ -0,0 +1,250 @@
+"""Compare compact embedding storage settings on the crawled documentation.
+
+For each setting this searches the stored embeddings with the compact
+representation, optionally reranks the candidates at full precision, and
+reports recall@k against an exact full-precision search, the storage per
+vector and the search latency. Queries are stored chunks, held out from
+their own results.
+
+    python benchmark_quantization.py --limit 5000 --queries 200 --k 5
+
+Settings:
+
+    float32          the full embedding (the baseline)
+    halfvec-N        the first N dimensions, renormalized, as float16
+    binary           one bit per dimension, compared by Hamming distance
+
+`+rerank` rows take the top --candidates results of the compact search and
+rerank them with the full embedding, as match_site_pages_two_stage does.
+
+Storage is the size of one value in Postgres. HNSW indexes add roughly
+2 * m * 4 bytes of graph links per row on top. When DATABASE_URL is set,
+the real size of each index on site_pages is also reported, including the
+halfvec and binary indexes from sql/quantize_site_pages.sql.
+
+With --rpc, the same queries are also sent to match_site_pages and to
+match_site_pages_two_stage to measure the end-to-end latency in Postgres.
+"""
+
+import argparse
+import json
+import numpy as np
+import os
+import psycopg
+import time
+
+from dotenv import load_dotenv
+from supabase import Client, create_client
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def load_embeddings(supabase_client: Client, limit: int, page_size: int = 1000) -> np.ndarray:
+    # PostgREST returns at most max_rows (1000 by default) rows per request.
+    vectors = []
+    while len(vectors) < limit:
+        start = len(vectors)
+        result = supabase_client.from_("site_pages") \
+            .select("embedding") \
+            .not_.is_("embedding", "null") \
+            .order("id") \
+            .range(start, min(start + page_size, limit) - 1) \
+            .execute()
+        # PostgREST returns vectors as strings like "[0.1,0.2,...]".
+        vectors.extend(
+            json.loads(row["embedding"]) if isinstance(row["embedding"], str) else row["embedding"]
+            for row in result.data
+        )
+        if len(result.data) < min(page_size, limit - start):
+            break
+    return normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def index_sizes(database_url: str) -> List[Tuple[str, str, int]]:
+    """Name, access method and size in bytes of each index on site_pages, largest first."""
+    with psycopg.connect(database_url) as conn:
+        return conn.execute(
+            """
+            select c.relname, am.amname, pg_relation_size(c.oid)
+            from pg_index i
+            join pg_class c on c.oid = i.indexrelid
+            join pg_am am on am.oid = c.relam
+            where i.indrelid = 'site_pages'::regclass
+            order by pg_relation_size(c.oid) desc
+            """
+        ).fetchall()
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores in each row, best first."""
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, indices, axis=1), axis=1)
+    return np.take_along_axis(indices, order, axis=1)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = [len(set(f) & set(e)) for f, e in zip(found, expected)]
+    return sum(hits) / expected.size
+
+
+class Setting:
+    """A compact representation and the similarity used to search it."""
+
+    def __init__(self, name: str, bytes_per_vector: int, encode: Callable, similarity: Callable):
+        self.name = name
+        self.bytes_per_vector = bytes_per_vector
+        self.encode = encode
+        self.similarity = similarity
+
+
+def float32_setting(dimensions: int) -> Setting:
+    return Setting(
+        "float32",
+        4 * dimensions + 8,
+        lambda m: m,
+        lambda q, d: q @ d.T,
+    )
+
+
+def halfvec_setting(dimensions: int) -> Setting:
+    return Setting(
+        f"halfvec-{dimensions}",
+        2 * dimensions + 8,
+        lambda m: normalize(m[:, :dimensions]).astype(np.float16),
+        lambda q, d: q.astype(np.float32) @ d.astype(np.float32).T,
+    )
+
+
+def binary_setting(dimensions: int) -> Setting:
+    # Number of set bits in each byte value.
+    popcount = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int32)
+
+    def similarity(q: np.ndarray, d: np.ndarray) -> np.ndarray:
+        # Negative Hamming distance between the packed sign bits, one query at a time.
+        return -np.stack([popcount[np.bitwise_xor(row, d)].sum(axis=1) for row in q])
+
+    return Setting(
+        "binary",
+        dimensions // 8 + 8,
+        lambda m: np.packbits(m > 0, axis=1),
+        similarity,
+    )
+
+
+def evaluate(
+    setting: Setting,
+    documents: np.ndarray,
+    query_ids: np.ndarray,
+    expected: np.ndarray,
+    k: int,
+    candidates: Optional[int],
+) -> Dict[str, float]:
+    encoded = setting.encode(documents)
+    queries = encoded[query_ids]
+
+    start = time.perf_counter()
+    scores = setting.similarity(queries, encoded).astype(np.float32)
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf
+    if candidates is None:
+        found = top_k(scores, k)
+    else:
+        # Rerank the candidates with the full-precision embedding.
+        shortlist = top_k(scores, min(candidates, len(documents) - 1))
+        full = np.einsum("qd,qcd->qc", documents[query_ids], documents[shortlist])
+        found = np.take_along_axis(shortlist, top_k(full, k), axis=1)
+    seconds = time.perf_counter() - start
+
+    return {
+        f"recall@{k}": recall(found, expected),
+        "bytes_per_vector": setting.bytes_per_vector,
+        "ms_per_query": seconds / len(query_ids) * 1000,
+    }
+
+
+def benchmark_rpc(
+    supabase_client: Client,
+    documents: np.ndarray,
+    query_ids: np.ndarray,
+    k: int,
+    candidates: int,
+) -> Dict[str, float]:
+    """Median latency of each search function in Postgres, in milliseconds."""
+    calls = {
+        "exact": ("match_site_pages", {}),
+        "halfvec": ("match_site_pages_two_stage", {"coarse": "halfvec", "candidate_count": candidates}),
+        "binary": ("match_site_pages_two_stage", {"coarse": "binary", "candidate_count": candidates}),
+    }
+    latencies = {}
+    for mode, (function, params) in calls.items():
+        timings = []
+        for query_id in query_ids:
+            start = time.perf_counter()
+            supabase_client.rpc(
+                function,
+                {"query_embedding": documents[query_id].tolist(), "match_count": k, **params},
+            ).execute()
+            timings.append(time.perf_counter() - start)
+        latencies[mode] = float(np.median(timings)) * 1000
+    return latencies
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compare compact embedding storage settings.")
+    parser.add_argument("--limit", type=int, default=5000, help="Number of stored chunks to search.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of held-out queries.")
+    parser.add_argument("--k", type=int, default=5, help="Results per query.")
+    parser.add_argument("--candidates", type=int, default=100, help="Candidates to rerank in two-stage search.")
+    parser.add_argument("--dimensions", default="128,256,512", help="Comma-separated halfvec dimensions to try.")
+    parser.add_argument("--rpc", action="store_true", help="Also time the search functions in Postgres.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    supabase_client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    documents = load_embeddings(supabase_client, args.limit)
+    count, dimensions = documents.shape
+    print(f"Loaded {count} embeddings with {dimensions} dimensions\n")
+
+    rng = np.random.default_rng(args.seed)
+    query_ids = rng.choice(count, size=min(args.queries, count), replace=False)
+
+    # The right answers come from an exact search at full precision.
+    exact = documents[query_ids] @ documents.T
+    exact[np.arange(len(query_ids)), query_ids] = -np.inf
+    expected = top_k(exact, args.k)
+
+    settings: List[Setting] = [float32_setting(dimensions)]
+    settings += [halfvec_setting(int(d)) for d in args.dimensions.split(",") if int(d) < dimensions]
+    settings.append(binary_setting(dimensions))
+
+    print(f"{'setting':<20} {f'R@{args.k}':>6} {'bytes':>7} {'ms/query':>10}")
+    for setting in settings:
+        for candidates in (None, args.candidates):
+            if setting.name == "float32" and candidates is not None:
+                continue
+            name = setting.name if candidates is None else f"{setting.name}+rerank"
+            results = evaluate(setting, documents, query_ids, expected, args.k, candidates)
+            print(
+                f"{name:<20} {results[f'recall@{args.k}']:>6.3f} "
+                f"{results['bytes_per_vector']:>7} {results['ms_per_query']:>10.2f}"
+            )
+
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        print("\nIndex sizes")
+        for name, method, size in index_sizes(database_url):
+            print(f"{name:<36} {method:<6} {size / 2**20:>10.1f} MB")
+    else:
+        print("\nSet DATABASE_URL to also report the index sizes.")
+
+    if args.rpc:
+        print(f"\nPostgres latency (median of {len(query_ids)} queries)")
+        for mode, milliseconds in benchmark_rpc(supabase_client, documents, query_ids, args.k, args.candidates).items():
+            print(f"{mode:<20} {milliseconds:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
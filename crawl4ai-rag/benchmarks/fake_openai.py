@@ -0,0 +1,331 @@
+"""A fake OpenAI API for benchmarks.
+
+Serves the two endpoints the RAG pipeline uses, with a configurable latency
+and rate limit, and counts every request:
+
+    POST /v1/chat/completions
+        With `response_format` json_object (the crawler): returns a title and
+        summary taken from the chunk, or from each chunk of a batch.
+        With tools (the agent): first calls `retrieve_relevant_documentation`
+        with the user's question, then usually `get_page_content` for the
+        page of one of the top chunks (see `page_choices`), then answers
+        from the tool's result.
+        With `stream`, the response is sent as chunks, like the real API.
+    POST /v1/embeddings
+        Deterministic bag-of-words embeddings, so texts that share words are
+        close together and retrieval returns meaningful results.
+    GET /stats
+        Request, token and 429 counts.
+
+Run it on its own to point other scripts at it:
+
+    python benchmarks/fake_openai.py --port 8001 --latency 0.2 --rpm 3000
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python crawl_site_docs.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+
+from aiohttp import web
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+
+word_pattern = re.compile(r"[a-z0-9_]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def embed_text(text: str, dimensions: int) -> List[float]:
+    """Hash each word to a dimension and sign, then normalize."""
+    vector = [0.0] * dimensions
+    for word, count in Counter(word_pattern.findall(text.lower())).items():
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[index] += sign * (1 + math.log(count))
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeOpenAI:
+    """The fake API and its counters.
+
+    `latency` and `embedding_latency` are mean response times in seconds,
+    with `jitter` as a fraction of the mean. `rpm` limits requests per
+    minute across both endpoints; requests over the limit get a 429.
+
+    `page_choices` are the chances of reading the page of the first,
+    second, ... retrieved chunk. The rest of the time no page is read, so
+    prefetched pages are not always the ones asked for.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        embedding_latency: float = 0.0,
+        jitter: float = 0.2,
+        rpm: Optional[int] = None,
+        seed: int = 0,
+        page_choices: Sequence[float] = (0.5, 0.15, 0.1, 0.05, 0.05),
+    ):
+        self.latency = latency
+        self.embedding_latency = embedding_latency
+        self.jitter = jitter
+        self.rpm = rpm
+        self.page_choices = page_choices
+        self.random = random.Random(seed)
+        self._recent: Deque[float] = deque()
+        self.stats: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_get("/stats", self.get_stats)
+        return app
+
+    def reset(self):
+        self.stats.clear()
+
+    def _page_to_read(self, body: Dict[str, Any], messages: List[Dict[str, Any]]) -> Optional[str]:
+        """The page URL of a retrieved chunk, if the last message is the result of retrieval."""
+        tools = {tool["function"]["name"] for tool in body.get("tools") or []}
+        if "get_page_content" not in tools or messages[-1]["role"] != "tool":
+            return None
+        calls = next((m.get("tool_calls") or [] for m in reversed(messages) if m["role"] == "assistant"), [])
+        if not any(call["function"]["name"] == "retrieve_relevant_documentation" for call in calls):
+            return None
+        sources = source_pattern.findall(_message_text(messages[-1]))
+        draw = self.random.random()
+        for source, chance in zip(sources, self.page_choices):
+            if draw < chance:
+                return source
+            draw -= chance
+        return None
+
+    async def _delay(self, mean: float):
+        if mean > 0:
+            await asyncio.sleep(max(0.0, self.random.gauss(mean, mean * self.jitter)))
+
+    def _rate_limited(self) -> Optional[web.Response]:
+        if not self.rpm:
+            return None
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if len(self._recent) >= self.rpm:
+            self.stats["rate_limited"] += 1
+            retry_after = 60 - (now - self._recent[0])
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429,
+                headers={"retry-after-ms": str(int(retry_after * 1000))},
+            )
+        self._recent.append(now)
+        return None
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        limited = self._rate_limited()
+        if limited:
+            return limited
+        body = await request.json()
+        await self._delay(self.latency)
+
+        messages: List[Dict[str, Any]] = body["messages"]
+        prompt = "".join(_message_text(message) for message in messages)
+        message: Dict[str, Any]
+
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            self.stats["chat_json"] += 1
+            user_content = _message_text(messages[-1])
+            if '"results"' in _message_text(messages[0]):
+                # Several chunks in one request, each starting with "### Chunk <id>".
+                results = [
+                    {"id": int(match.group(1)), **_title_and_summary(match.group(2))}
+                    for match in batch_chunk_pattern.finditer(user_content)
+                ]
+                content = json.dumps({"results": results})
+            else:
+                content = json.dumps(_title_and_summary(user_content.split("Content:\n", 1)[-1]))
+            message = {"role": "assistant", "content": content}
+            finish_reason = "stop"
+        elif body.get("tools") and messages[-1]["role"] != "tool":
+            self.stats["chat_tool_call"] += 1
+            question = next(
+                (_message_text(m) for m in reversed(messages) if m["role"] == "user"), ""
+            )
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{self.stats['chat_tool_call']}",
+                    "type": "function",
+                    "function": {
+                        "name": "retrieve_relevant_documentation",
+                        "arguments": json.dumps({"user_query": question}),
+                    },
+                }],
+            }
+            finish_reason = "tool_calls"
+        elif page_url := self._page_to_read(body, messages):
+            # Like the real agent, read the page of a retrieved chunk, usually a top one.
+            self.stats["chat_tool_call"] += 1
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{self.stats['chat_tool_call']}",
+                    "type": "function",
+                    "function": {"name": "get_page_content", "arguments": json.dumps({"url": page_url})},
+                }],
+            }
+            finish_reason = "tool_calls"
+        else:
+            self.stats["chat_text"] += 1
+            context = _message_text(messages[-1])
+            message = {"role": "assistant", "content": f"From the documentation: {context[:300]}"}
+            finish_reason = "stop"
+
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(json.dumps(message))
+        self.stats["chat_requests"] += 1
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+
+        completion = {
+            "id": f"chatcmpl-{self.stats['chat_requests']}",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+        }
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if body.get("stream"):
+            self.stats["chat_streams"] += 1
+            return await self._stream(request, completion, message, finish_reason, usage)
+
+        return web.json_response({
+            **completion,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    async def _stream(
+        self,
+        request: web.Request,
+        completion: Dict[str, Any],
+        message: Dict[str, Any],
+        finish_reason: str,
+        usage: Dict[str, int],
+    ) -> web.StreamResponse:
+        """Send a completion as server-sent event chunks, text a few words at a time."""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(choices: List[Dict[str, Any]], **extra: Any):
+            chunk = {**completion, "object": "chat.completion.chunk", "choices": choices, **extra}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        if message.get("tool_calls"):
+            tool_calls = [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]
+            await send([{"index": 0, "delta": {"role": "assistant", "tool_calls": tool_calls}, "finish_reason": None}])
+        else:
+            words = message["content"].split(" ")
+            for i in range(0, len(words), 4):
+                text = " ".join(words[i : i + 4]) + (" " if i + 4 < len(words) else "")
+                await send([{"index": 0, "delta": {"role": "assistant", "content": text}, "finish_reason": None}])
+                await asyncio.sleep(0)
+        await send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        await send([], usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        limited = self._rate_limited()
+        if limited:
+            return limited
+        body = await request.json()
+        await self._delay(self.embedding_latency)
+
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions") or 1536
+        tokens = sum(estimate_tokens(text) for text in texts)
+        self.stats["embedding_requests"] += 1
+        self.stats["embedding_inputs"] += len(texts)
+        self.stats["embedding_tokens"] += tokens
+
+        return web.json_response({
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": embed_text(text, dimensions)}
+                for i, text in enumerate(texts)
+            ],
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+
+batch_chunk_pattern = re.compile(r"### Chunk (\d+)\n.*?Content:\n(.*?)(?=\n\n### Chunk \d+\n|\Z)", re.DOTALL)
+
+
+source_pattern = re.compile(r"^Source: (\S+)$", re.MULTILINE)
+
+
+def _title_and_summary(content: str) -> Dict[str, str]:
+    lines = [line.strip("# ").strip() for line in content.splitlines() if line.strip()]
+    title = lines[0][:80] if lines else "Untitled"
+    return {"title": title, "summary": " ".join(content.split())[:200]}
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content)
+    return content
+
+
+async def start_server(fake: FakeOpenAI, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    """Start the fake API in the running event loop. Port 0 picks a free port."""
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+def server_url(runner: web.AppRunner) -> str:
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean chat completion latency in seconds.")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Mean embedding latency in seconds.")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before returning 429.")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(latency=args.latency, embedding_latency=args.embedding_latency, rpm=args.rpm)
+    web.run_app(fake.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""A static documentation site for benchmarks.
+
+Generates `pages` HTML pages with headings, paragraphs and code blocks, plus
+a sitemap.xml, and serves them from a local web server. The content is
+deterministic for a given seed, so runs are comparable.
+"""
+
+import html
+import os
+import random
+
+from aiohttp import web
+from dataclasses import dataclass
+from typing import List
+
+
+topics = [
+    "agents", "tools", "dependencies", "models", "streaming", "results", "retries",
+    "messages", "testing", "logging", "validation", "prompts", "settings", "graphs",
+    "evals", "usage", "errors", "schemas", "sessions", "caching",
+]
+
+vocabulary = """
+agent tool model request response stream result message prompt system user
+context dependency injection validator schema field type retry timeout
+error exception handler logger span trace metric token usage limit cache
+session state graph node edge run step function decorator argument return
+value default config setting environment client server async await task
+""".split()
+
+
+@dataclass
+class FixturePage:
+    path: str
+    title: str
+    headings: List[str]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(vocabulary, k=rng.randint(8, 16))
+    return " ".join(words).capitalize() + "."
+
+
+def _page_html(rng: random.Random, title: str, headings: List[str], sections_words: int) -> str:
+    body = [f"<h1>{html.escape(title)}</h1>"]
+    for heading in headings:
+        body.append(f"<h2>{html.escape(heading)}</h2>")
+        words = 0
+        while words < sections_words:
+            paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+            body.append(f"<p>{html.escape(paragraph)}</p>")
+            words += len(paragraph.split())
+        name = heading.lower().replace(" ", "_")
+        body.append(f"<pre><code>def {name}(ctx):\n    return ctx.deps.{rng.choice(vocabulary)}\n</code></pre>")
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(title)}</title></head>"
+        f"<body><nav><a href=\"/\">Home</a></nav><main>{''.join(body)}</main></body></html>"
+    )
+
+
+def generate_site(directory: str, pages: int = 50, sections: int = 6, section_words: int = 250, seed: int = 0) -> List[FixturePage]:
+    """Write the pages into `directory` and return what was written.
+
+    The sitemap's URLs are relative to the server; `sitemap_xml` fills in
+    the host once the server has a port.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    fixture_pages = []
+    for i in range(pages):
+        topic = topics[i % len(topics)]
+        title = f"{topic.capitalize()} guide {i}"
+        headings = [f"{topic.capitalize()} {rng.choice(vocabulary)} {rng.choice(vocabulary)}" for _ in range(sections)]
+        path = f"/docs/{topic}-{i}/"
+        page_directory = os.path.join(directory, path.strip("/"))
+        os.makedirs(page_directory, exist_ok=True)
+        with open(os.path.join(page_directory, "index.html"), "w") as f:
+            f.write(_page_html(rng, title, headings, section_words))
+        fixture_pages.append(FixturePage(path=path, title=title, headings=headings))
+    return fixture_pages
+
+
+def sitemap_xml(base_url: str, pages: List[FixturePage]) -> str:
+    urls = "".join(f"<url><loc>{base_url}{page.path}</loc></url>" for page in pages)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+    )
+
+
+async def start_site(directory: str, pages: List[FixturePage], host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    """Serve the generated site. Port 0 picks a free port."""
+    app = web.Application()
+
+    async def sitemap(request: web.Request) -> web.Response:
+        base_url = f"{request.scheme}://{request.host}"
+        return web.Response(text=sitemap_xml(base_url, pages), content_type="application/xml")
+
+    async def page(request: web.Request) -> web.StreamResponse:
+        path = os.path.join(directory, "docs", request.match_info["path"].strip("/"), "index.html")
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        return web.FileResponse(path, headers={"Content-Type": "text/html; charset=utf-8"})
+
+    app.router.add_get("/sitemap.xml", sitemap)
+    app.router.add_get("/docs/{path:.*}", page)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
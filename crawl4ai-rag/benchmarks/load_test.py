@@ -0,0 +1,274 @@
+"""Load test for the API (api.py) against local stand-ins.
+
+Starts the fake OpenAI API (fake_openai.py) and the API under uvicorn, then
+runs increasing numbers of concurrent conversations against it. Each
+conversation sends `--turns` messages, one after another, and reads the
+streamed replies. Requests turned away with 429 or 503 are retried after
+their Retry-After delay.
+
+For each level of concurrency it reports throughput, time to the first
+streamed text and to the end of the turn, rejections, and the CPU used by
+the API processes. The result is the number of concurrent conversations
+per core: the highest level that kept the p99 turn time within `--slo`
+seconds without errors, divided by the cores the API was busy on.
+
+    python benchmarks/load_test.py --sessions 1,8,32,128 --workers 2
+
+The agent's tools query the local Supabase database, as in
+run_benchmark.py. The database can be empty.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(benchmarks_dir)
+sys.path.append(project_dir)
+
+import aiohttp
+import psutil
+
+from dotenv import load_dotenv
+from page_pool import cpu_seconds, rss_mb
+from run_benchmark import git_commit, percentile
+
+
+questions = [
+    "How do I define a tool for an agent?",
+    "How do I stream a response?",
+    "How do dependencies work?",
+    "How do I test an agent without calling a model?",
+    "How do I set a retry limit?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_ready(session: aiohttp.ClientSession, url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with code {process.returncode}")
+        try:
+            async with session.get(url) as response:
+                if response.status < 500:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} did not start within {timeout} seconds")
+
+
+class Turns:
+    """Measurements for one level of concurrency."""
+
+    def __init__(self):
+        self.first_text: List[float] = []
+        self.seconds: List[float] = []
+        self.rejected: Dict[int, int] = {}
+        self.errors = 0
+
+
+async def run_turn(session: aiohttp.ClientSession, url: str, tenant: str, prompt: str, turns: Turns, max_retries: int):
+    for _ in range(max_retries + 1):
+        started = time.perf_counter()
+        first_text: Optional[float] = None
+        async with session.post(url, json={"prompt": prompt}, headers={"X-Tenant-ID": tenant}) as response:
+            if response.status in (429, 503):
+                turns.rejected[response.status] = turns.rejected.get(response.status, 0) + 1
+                await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+                continue
+            if response.status != 200:
+                turns.errors += 1
+                return
+
+            event = None
+            async for line in response.content:
+                line = line.decode().rstrip("\n")
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    if event == "delta" and first_text is None:
+                        first_text = time.perf_counter() - started
+                    elif event == "error":
+                        turns.errors += 1
+                        return
+                    elif event == "done":
+                        turns.seconds.append(time.perf_counter() - started)
+                        turns.first_text.append(first_text if first_text is not None else turns.seconds[-1])
+                        return
+            turns.errors += 1  # The stream ended without "done".
+            return
+    turns.errors += 1
+
+
+async def run_conversation(session: aiohttp.ClientSession, api_url: str, number: int, args: argparse.Namespace, turns: Turns):
+    tenant = f"tenant-{number % args.tenants}"
+    url = f"{api_url}/conversations/load-{os.getpid()}-{time.time_ns()}-{number}/messages"
+    for turn in range(args.turns):
+        await run_turn(session, url, tenant, questions[(number + turn) % len(questions)], turns, args.max_retries)
+
+
+async def run_level(api_url: str, sessions: int, args: argparse.Namespace, processes: List[psutil.Process]) -> Dict[str, Any]:
+    turns = Turns()
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        cpu_before = cpu_seconds(processes)
+        started = time.perf_counter()
+        await asyncio.gather(*(run_conversation(session, api_url, i, args, turns) for i in range(sessions)))
+        seconds = time.perf_counter() - started
+        cpu = cpu_seconds(processes) - cpu_before
+
+    cores = cpu / seconds
+    completed = len(turns.seconds)
+    return {
+        "sessions": sessions,
+        "turns": completed,
+        "errors": turns.errors,
+        "rejected_429": turns.rejected.get(429, 0),
+        "rejected_503": turns.rejected.get(503, 0),
+        "turns_per_second": completed / seconds,
+        "first_text_p50_ms": percentile(turns.first_text, 50) * 1000,
+        "first_text_p99_ms": percentile(turns.first_text, 99) * 1000,
+        "turn_p50_ms": percentile(turns.seconds, 50) * 1000,
+        "turn_p99_ms": percentile(turns.seconds, 99) * 1000,
+        "cores_busy": cores,
+        "cpu_ms_per_turn": cpu / max(completed, 1) * 1000,
+        "rss_mb": rss_mb(processes),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fake_port, api_port = free_port(), free_port()
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(benchmarks_dir, "fake_openai.py"),
+        "--port", str(fake_port),
+        "--latency", str(args.latency),
+        "--embedding-latency", str(args.embedding_latency),
+    ])
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OPENAI_API_KEY": "load-test",
+        "EMBEDDING_PROVIDER": "openai",
+        "SESSION_STORE": args.session_store,
+        "API_MAX_CONCURRENT": str(args.max_concurrent),
+        "API_TENANT_CONCURRENCY": str(args.tenant_concurrency),
+    }
+    env.pop("EMBEDDING_MODEL", None)
+    api = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "api:app",
+            "--port", str(api_port),
+            "--workers", str(args.workers),
+            "--log-level", "warning",
+        ],
+        cwd=project_dir,
+        env=env,
+    )
+    api_url = f"http://127.0.0.1:{api_port}"
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_until_ready(session, f"http://127.0.0.1:{fake_port}/stats", fake)
+            await wait_until_ready(session, f"{api_url}/health", api)
+
+        # With several workers, uvicorn's parent process supervises worker processes.
+        processes = [psutil.Process(api.pid), *psutil.Process(api.pid).children(recursive=True)]
+        levels = []
+        for sessions in args.sessions:
+            level = await run_level(api_url, sessions, args, processes)
+            levels.append(level)
+            print(
+                f"{sessions:>5} sessions: {level['turns_per_second']:.1f} turns/s, "
+                f"first text p50 {level['first_text_p50_ms']:.0f} ms, "
+                f"turn p99 {level['turn_p99_ms']:.0f} ms, "
+                f"{level['rejected_429'] + level['rejected_503']} rejected, {level['errors']} errors, "
+                f"{level['cores_busy']:.2f} cores"
+            )
+
+        within_slo = [
+            level for level in levels
+            if level["errors"] == 0 and level["turns"] and level["turn_p99_ms"] <= args.slo * 1000
+        ]
+        best = max(within_slo, key=lambda level: level["sessions"], default=None)
+        return {
+            "levels": levels,
+            "max_sessions_within_slo": best["sessions"] if best else 0,
+            "sessions_per_core": best["sessions"] / max(best["cores_busy"], 0.01) if best else 0.0,
+            "sessions_per_worker": best["sessions"] / args.workers if best else 0.0,
+        }
+    finally:
+        api.terminate()
+        fake.terminate()
+        api.wait()
+        fake.wait()
+
+
+def main():
+    load_dotenv(os.path.join(project_dir, ".env"))
+    parser = argparse.ArgumentParser(description="Load test the API against local stand-ins.")
+    parser.add_argument("--sessions", type=lambda value: [int(n) for n in value.split(",")], default=[1, 8, 32, 128],
+                        help="Comma-separated numbers of concurrent conversations to test.")
+    parser.add_argument("--turns", type=int, default=3, help="Messages per conversation.")
+    parser.add_argument("--tenants", type=int, default=16, help="Tenants the conversations are spread over.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="uvicorn worker processes. The concurrency limits apply to each worker.")
+    parser.add_argument("--max-concurrent", type=int, default=32, help="API_MAX_CONCURRENT for each worker.")
+    parser.add_argument("--tenant-concurrency", type=int, default=4, help="API_TENANT_CONCURRENCY for each worker.")
+    parser.add_argument("--session-store", default="memory", choices=["memory", "supabase"],
+                        help="With several workers, use supabase so every worker sees every conversation.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mean chat completion latency in seconds.")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Mean embedding latency in seconds.")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries for a turn turned away with 429 or 503.")
+    parser.add_argument("--slo", type=float, default=5.0, help="Highest acceptable p99 turn time, in seconds.")
+    parser.add_argument("--output", help="Results file. Defaults to benchmarks/results/load-<time>-<commit>.json.")
+    parser.add_argument("--allow-remote", action="store_true", help="Allow a SUPABASE_URL that is not local.")
+    args = parser.parse_args()
+
+    host = urlparse(os.getenv("SUPABASE_URL", "")).hostname
+    if host not in ("localhost", "127.0.0.1") and not args.allow_remote:
+        parser.error(f"SUPABASE_URL points at {host}. Use the local Supabase stack, or pass --allow-remote.")
+
+    metrics = asyncio.run(run(args))
+    git = git_commit()
+    timestamp = datetime.now(timezone.utc)
+    results = {
+        "git": git,
+        "timestamp": timestamp.isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "cpu_count": os.cpu_count(),
+        "metrics": metrics,
+    }
+
+    output = args.output or os.path.join(
+        benchmarks_dir, "results", f"load-{timestamp:%Y%m%dT%H%M%S}-{git['commit'][:8] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(
+        f"\n{metrics['max_sessions_within_slo']} concurrent sessions within a {args.slo:g} s p99 "
+        f"({metrics['sessions_per_core']:.0f} per busy core, {metrics['sessions_per_worker']:.0f} per worker)"
+    )
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
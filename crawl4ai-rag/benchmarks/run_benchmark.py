@@ -0,0 +1,296 @@
+"""End-to-end benchmark of the RAG pipeline against local stand-ins.
+
+Starts a fake OpenAI API (fake_openai.py) and a static documentation site
+(fixture_site.py), then:
+
+1. crawls the site with `crawl_site_docs.crawl_parallel` into the local
+   Supabase database,
+2. times retrieval (query embedding plus `match_site_pages`) for questions
+   about the crawled pages,
+3. runs the Pydantic AI expert agent on the same questions.
+
+Nothing leaves the machine. Run the local Supabase stack first and use a
+scratch database: the benchmark's pages are stored next to any others and
+removed at the end.
+
+    python benchmarks/run_benchmark.py --pages 50 --latency 0.3 --rpm 3000
+    python benchmarks/run_benchmark.py --baseline benchmarks/results/<earlier run>.json
+
+Results are written as JSON, tagged with the git commit, so runs can be
+compared between commits.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(benchmarks_dir)
+sys.path.append(project_dir)
+
+from dotenv import load_dotenv
+from fake_openai import FakeOpenAI, server_url, start_server
+from fixture_site import FixturePage, generate_site, start_site
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def git_commit() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=project_dir, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def make_questions(pages: List[FixturePage], base_url: str, count: int, seed: int) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    questions = []
+    for page in rng.sample(pages, min(count, len(pages))):
+        heading = rng.choice(page.headings)
+        questions.append({"question": f"How do I use {heading.lower()}?", "url": f"{base_url}{page.path}"})
+    return questions
+
+
+async def benchmark_crawl(crawl_site_docs, fake: FakeOpenAI, base_url: str, pages: int, concurrency: int, verbose: bool) -> Dict[str, Any]:
+    from sitemap import iter_sitemap
+
+    async def urls():
+        async for entry in iter_sitemap(f"{base_url}/sitemap.xml"):
+            yield entry.loc
+
+    fake.reset()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        crawled = await crawl_site_docs.crawl_parallel(urls(), max_concurrent=concurrency)
+    seconds = time.perf_counter() - start
+
+    result = crawl_site_docs.supabase_client.table("site_pages") \
+        .select("id", count="exact") \
+        .like("url", f"{base_url}%") \
+        .execute()
+    chunks = result.count or 0
+    stats = dict(fake.stats)
+
+    return {
+        "pages": crawled,
+        "chunks": chunks,
+        "seconds": seconds,
+        "pages_per_second": crawled / seconds,
+        "chunks_per_second": chunks / seconds,
+        "chat_calls_per_page": stats.get("chat_requests", 0) / max(crawled, 1),
+        "embedding_calls_per_page": stats.get("embedding_requests", 0) / max(crawled, 1),
+        "rate_limited": stats.get("rate_limited", 0),
+        "incomplete": crawled < pages,
+    }
+
+
+async def benchmark_retrieval(deps, questions: List[Dict[str, str]]) -> Dict[str, Any]:
+    from pydantic_ai_expert import get_embedding, match_site_pages
+
+    latencies = []
+    hits = 0
+    for question in questions:
+        start = time.perf_counter()
+        query_embedding = await get_embedding(question["question"], deps.embedding_provider)
+        documents = match_site_pages(
+            deps.supabase_client, query_embedding, match_count=5, filter={"source": "pydantic_ai_docs"}
+        )
+        latencies.append(time.perf_counter() - start)
+        hits += any(doc["url"] == question["url"] for doc in documents)
+
+    return {
+        "queries": len(questions),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "recall@5": hits / max(len(questions), 1),
+    }
+
+
+async def benchmark_agent(deps, fake: FakeOpenAI, questions: List[Dict[str, str]]) -> Dict[str, Any]:
+    from pydantic_ai_expert import PrefetchStats, PydanticAIDeps, get_pydantic_ai_expert
+
+    agent = get_pydantic_ai_expert()
+    fake.reset()
+    turns, tokens, latencies = [], [], []
+    prefetch = PrefetchStats()
+    for question in questions:
+        # Each run gets its own page cache, as in the apps.
+        run_deps = PydanticAIDeps(
+            openai_client=deps.openai_client,
+            supabase_client=deps.supabase_client,
+            embedding_provider=deps.embedding_provider,
+        )
+        start = time.perf_counter()
+        try:
+            result = await agent.run(question["question"], deps=run_deps)
+        finally:
+            run_deps.page_cache.close()
+        latencies.append(time.perf_counter() - start)
+        usage = result.usage()
+        turns.append(usage.requests)
+        tokens.append(usage.total_tokens or 0)
+        prefetch.add(run_deps.page_cache.stats)
+
+    print(f"Answered {len(questions)} questions")
+    print(prefetch.report())
+    count = max(len(questions), 1)
+    return {
+        "questions": len(questions),
+        "turns_per_question": sum(turns) / count,
+        "tokens_per_question": sum(tokens) / count,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rate_limited": fake.stats.get("rate_limited", 0),
+        "prefetch_hit_rate": prefetch.hit_rate,
+        "prefetch_unused_per_question": prefetch.unused / count,
+        "prefetch_saved_ms_per_question": prefetch.saved_seconds * 1000 / count,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="rag-benchmark-")
+    fake = FakeOpenAI(
+        latency=args.latency,
+        embedding_latency=args.embedding_latency,
+        rpm=args.rpm,
+        seed=args.seed,
+    )
+    api = await start_server(fake)
+    fixture_pages = generate_site(os.path.join(workdir, "site"), pages=args.pages, seed=args.seed)
+    site = await start_site(os.path.join(workdir, "site"), fixture_pages)
+    base_url = server_url(site)
+
+    # Point the pipeline at the stand-ins before its modules create their clients.
+    os.environ.update({
+        "OPENAI_BASE_URL": f"{server_url(api)}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "EMBEDDING_PROVIDER": "openai",
+        "CRAWL_JOURNAL": os.path.join(workdir, "journal.jsonl"),
+    })
+    os.environ.pop("EMBEDDING_MODEL", None)
+    # The fetcher keeps its validators in the working directory.
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    import crawl_site_docs
+    from openai import AsyncOpenAI
+    from pydantic_ai_expert import PydanticAIDeps
+
+    try:
+        results: Dict[str, Any] = {"crawl": await benchmark_crawl(
+            crawl_site_docs, fake, base_url, args.pages, args.concurrency, args.verbose
+        )}
+        print(f"Crawled {results['crawl']['pages']} pages into {results['crawl']['chunks']} chunks")
+
+        deps = PydanticAIDeps(openai_client=AsyncOpenAI(), supabase_client=crawl_site_docs.supabase_client)
+        questions = make_questions(fixture_pages, base_url, args.questions, args.seed)
+        results["retrieval"] = await benchmark_retrieval(deps, questions)
+        results["agent"] = await benchmark_agent(deps, fake, questions)
+        return results
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            crawl_site_docs.supabase_client.table("site_pages").delete().like("url", f"{base_url}%").execute()
+        await site.cleanup()
+        await api.cleanup()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    current = flatten(results["metrics"])
+    previous = flatten(baseline["metrics"]) if baseline else {}
+    header = f"{'metric':<36} {'value':>12}"
+    if baseline:
+        header += f" {'baseline':>12} {'change':>8}"
+    print(header)
+    for name, value in current.items():
+        line = f"{name:<36} {value:>12.2f}"
+        if name in previous:
+            change = (value - previous[name]) / previous[name] * 100 if previous[name] else 0.0
+            line += f" {previous[name]:>12.2f} {change:>+7.1f}%"
+        print(line)
+    if baseline:
+        print(f"\nBaseline: {baseline['git']['commit'][:12]} ({baseline['timestamp']})")
+
+
+def main():
+    load_dotenv(os.path.join(project_dir, ".env"))
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline against local stand-ins.")
+    parser.add_argument("--pages", type=int, default=50, help="Pages in the fixture site.")
+    parser.add_argument("--concurrency", type=int, default=5, help="Pages crawled at once.")
+    parser.add_argument("--questions", type=int, default=20, help="Questions for retrieval and the agent.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mean chat completion latency in seconds.")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Mean embedding latency in seconds.")
+    parser.add_argument("--rpm", type=int, default=None, help="Fake API requests per minute before 429s.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results file. Defaults to benchmarks/results/<time>-<commit>.json.")
+    parser.add_argument("--baseline", help="Earlier results file to compare with.")
+    parser.add_argument("--keep", action="store_true", help="Keep the crawled pages in the database.")
+    parser.add_argument("--allow-remote", action="store_true", help="Allow a SUPABASE_URL that is not local.")
+    parser.add_argument("--verbose", action="store_true", help="Show the crawler's output.")
+    args = parser.parse_args()
+
+    host = urlparse(os.getenv("SUPABASE_URL", "")).hostname
+    if host not in ("localhost", "127.0.0.1") and not args.allow_remote:
+        parser.error(f"SUPABASE_URL points at {host}. Use the local Supabase stack, or pass --allow-remote.")
+
+    metrics = asyncio.run(run(args))
+    git = git_commit()
+    timestamp = datetime.now(timezone.utc)
+    results = {
+        "git": git,
+        "timestamp": timestamp.isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "metrics": metrics,
+    }
+
+    output = args.output or os.path.join(
+        benchmarks_dir, "results", f"{timestamp:%Y%m%dT%H%M%S}-{git['commit'][:8] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print()
+    print_results(results, baseline)
+    print(f"\nSaved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,23 @@
 import asyncio
 import json
 import os
-import requests
 
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+from batcher import MicroBatcher
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from dedup import BoilerplateStripper, ChunkIndex, Fingerprint
 from dotenv import load_dotenv
+from embeddings import get_embedding_provider
+from extract import Extraction, ExtractionStats, PageExtractor
+from fetcher import TieredFetcher
+from journal import CrawlJournal
+from scheduler import CrawlScheduler
+from sitemap import iter_sitemap
+from telemetry import configure_telemetry, db_seconds, llm_seconds, llm_tokens, retries, traced, write_metrics
 from openai import AsyncOpenAI
 from supabase import create_client, Client
-from typing import Any, Dict, List
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Set, Tuple, Union
 from urllib.parse import urlparse
-from xml.etree import ElementTree
 
 
 load_dotenv()
@@ -27,6 +33,19 @@ supabase_client: Client = create_client(
     os.getenv("SUPABASE_URL"),
     os.getenv("SUPABASE_SERVICE_KEY")
 )
+embedding_provider = get_embedding_provider(openai_client)
+
+# Near-identical chunks are stored once with a title, summary and embedding.
+# Copies reference that canonical chunk and are stored without an embedding.
+dedup_enabled = os.getenv("DEDUP", "on") != "off"
+chunk_index = ChunkIndex(max_distance=int(os.getenv("DEDUP_MAX_DISTANCE", "3")))
+boilerplate = BoilerplateStripper(min_pages=int(os.getenv("BOILERPLATE_MIN_PAGES", "3")))
+
+# How chunk titles and summaries are made: "llm" (every chunk), "local" (never
+# the LLM), "hybrid" (locally, and the LLM for chunks the local extractor is
+# not confident about) or "batch" (like hybrid, with several chunks per LLM request).
+title_summary_mode = os.getenv("TITLE_SUMMARY_MODE", "hybrid")
+extraction_stats = ExtractionStats()
 
 
 @dataclass
@@ -37,7 +56,7 @@ class ProcessedChunk:
     summary: str
     content: str
     metadata: Dict[str, Any]
-    embedding: List[float]
+    embedding: Optional[List[float]]
 
 
 def chunk_text(text: str, chunk_size: int = 4096) -> List[str]:
@@ -97,41 +116,160 @@ async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
     For the summary: Create a concise summary of the main points in this chunk.
     Keep both title and summary concise but informative."""
     
+    model = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    extraction_stats.llm_requests += 1
+    extraction_stats.llm_chunks += 1
     try:
-        response = await openai_client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}..."}  # Send first 1000 chars for context
-            ],
-            response_format={ "type": "json_object" }
-        )
+        with traced("llm title_summary", llm_seconds, {"operation": "title_summary"}, url=url, model=model) as span:
+            response = await openai_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}..."}  # Send first 1000 chars for context
+                ],
+                response_format={ "type": "json_object" }
+            )
+            if response.usage:
+                span.set_attribute("prompt_tokens", response.usage.prompt_tokens)
+                span.set_attribute("completion_tokens", response.usage.completion_tokens)
+                llm_tokens.inc(response.usage.prompt_tokens, operation="title_summary", kind="prompt")
+                llm_tokens.inc(response.usage.completion_tokens, operation="title_summary", kind="completion")
         return json.loads(response.choices[0].message.content)
     except Exception as e:
         print(f"Error getting title and summary: {e}")
         return {"title": "Error processing title", "summary": "Error processing summary"}
 
 
+async def get_titles_and_summaries(items: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+    """Extract titles and summaries for several (chunk, url) pairs in one request.
+
+    Chunks missing from the response are sent again one at a time.
+    """
+    system_prompt = """You are an AI that extracts titles and summaries from documentation chunks.
+    You will be given several chunks, each starting with "### Chunk <id>".
+    Return a JSON object with a "results" key: a list with one object per chunk, with "id", "title" and "summary" keys.
+    For the title: If this seems like the start of a document, extract its title. If it's a middle chunk, derive a descriptive title.
+    For the summary: Create a concise summary of the main points in this chunk.
+    Keep both title and summary concise but informative."""
+
+    content = "\n\n".join(
+        f"### Chunk {i}\nURL: {url}\n\nContent:\n{chunk[:1000]}..."
+        for i, (chunk, url) in enumerate(items)
+    )
+    model = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    extraction_stats.llm_requests += 1
+    results: Dict[int, Dict[str, str]] = {}
+    try:
+        with traced(
+            "llm title_summary_batch", llm_seconds, {"operation": "title_summary_batch"}, model=model, chunks=len(items)
+        ) as span:
+            response = await openai_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": content}
+                ],
+                response_format={ "type": "json_object" }
+            )
+            if response.usage:
+                span.set_attribute("prompt_tokens", response.usage.prompt_tokens)
+                span.set_attribute("completion_tokens", response.usage.completion_tokens)
+                llm_tokens.inc(response.usage.prompt_tokens, operation="title_summary_batch", kind="prompt")
+                llm_tokens.inc(response.usage.completion_tokens, operation="title_summary_batch", kind="completion")
+        for result in json.loads(response.choices[0].message.content).get("results", []):
+            if isinstance(result, dict) and "title" in result and "summary" in result:
+                results[int(result["id"])] = {"title": result["title"], "summary": result["summary"]}
+    except Exception as e:
+        print(f"Error getting titles and summaries: {e}")
+
+    # Chunks missing from the reply are summarized one at a time, and counted there.
+    missing = [i for i in range(len(items)) if i not in results]
+    extraction_stats.llm_chunks += len(items) - len(missing)
+    if missing:
+        retried = await asyncio.gather(*(get_title_and_summary(*items[i]) for i in missing))
+        results.update(zip(missing, retried))
+    return [results[i] for i in range(len(items))]
+
+
+title_summary_batcher = MicroBatcher(
+    get_titles_and_summaries,
+    batch_size=int(os.getenv("TITLE_SUMMARY_BATCH_SIZE", "8")),
+    max_wait=0.05,
+)
+
+
+async def extract_title_and_summary(chunk: str, url: str, local: Optional[Extraction] = None) -> Dict[str, str]:
+    """Get the title and summary of a chunk as TITLE_SUMMARY_MODE says."""
+    extraction_stats.chunks += 1
+    if title_summary_mode == "llm" or local is None:
+        return await get_title_and_summary(chunk, url)
+    if local.confident or title_summary_mode == "local":
+        extraction_stats.local += 1
+        return {"title": local.title or urlparse(url).path, "summary": local.summary}
+    if title_summary_mode == "batch":
+        return await title_summary_batcher.submit((chunk, url))
+    return await get_title_and_summary(chunk, url)
+
+
 async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from OpenAI."""
+    """Get embedding vector from the configured embedding provider.
+
+    Concurrent calls are embedded together in batches.
+    """
     try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        return await embedding_provider.embed_one(text)
     except Exception as e:
         print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+        return [0] * embedding_provider.dimensions  # Return zero vector on error
     
 
-async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChunk:
-    """Process a single chunk of text."""
-    # Get title and summary
-    extracted = await get_title_and_summary(chunk, url)
-    
-    # Get embedding
-    embedding = await get_embedding(chunk)
+async def canonical_extraction(payload: Any) -> Optional[Dict[str, str]]:
+    """Get the title and summary of a canonical chunk, waiting until it is stored.
+
+    Returns None if the canonical chunk could not be processed or stored.
+    """
+    if isinstance(payload, asyncio.Future):
+        await asyncio.wait([payload])
+        return None if payload.cancelled() else payload.result()
+    return payload
+
+
+async def process_chunk(chunk: str, chunk_number: int, url: str, local: Optional[Extraction] = None) -> Optional[ProcessedChunk]:
+    """Process a single chunk of text and store it.
+
+    `local` is the title and summary found without the LLM, if any. Returns
+    the stored chunk, or None if it could not be stored.
+    """
+    key = (url, chunk_number)
+    fingerprint = Fingerprint.of(chunk)
+    duplicate = chunk_index.find(fingerprint, key) if dedup_enabled else None
+
+    extracted = None
+    extraction = None
+    embedding = None
+    if duplicate:
+        # Reuse the title and summary of the canonical chunk. Without an
+        # embedding, the copy is never returned by a search.
+        extracted = await canonical_extraction(duplicate.payload)
+        if extracted is not None:
+            chunk_index.record(duplicate)
+            # This chunk may have been canonical in an earlier crawl.
+            chunk_index.discard(key)
+
+    if extracted is None:
+        duplicate = None
+        extraction = asyncio.get_running_loop().create_future()
+        if dedup_enabled:
+            chunk_index.add(key, fingerprint, extraction)
+        try:
+            # Get title and summary
+            extracted = await extract_title_and_summary(chunk, url, local)
+
+            # Get embedding
+            embedding = await get_embedding(chunk)
+        except BaseException:
+            extraction.cancel()
+            raise
     
     # Create metadata.
     parsed_url = urlparse(url)
@@ -140,9 +278,20 @@ async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChu
         "chunk_size": len(chunk),
         "crawled_at": datetime.now(timezone.utc).isoformat(),
         "url_path": parsed_url.path,
+        "content_hash": fingerprint.content_hash,
+        "simhash": f"{fingerprint.simhash:016x}",
     }
+    if duplicate:
+        canonical_url, canonical_chunk_number = duplicate.key
+        metadata["duplicate_of"] = {
+            "url": canonical_url,
+            "chunk_number": canonical_chunk_number,
+            "kind": duplicate.kind,
+        }
+    else:
+        metadata["embedding_model"] = f"{embedding_provider.name}:{embedding_provider.model}"
     
-    return ProcessedChunk(
+    processed = ProcessedChunk(
         url=url,
         chunk_number=chunk_number,
         title=extracted["title"],
@@ -151,10 +300,25 @@ async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChu
         metadata=metadata,
         embedding=embedding
     )
+    try:
+        result = await insert_chunk(processed)
+    except BaseException:
+        if extraction is not None:
+            extraction.cancel()
+        raise
+
+    # Copies waiting for this chunk may only point at it once it is stored.
+    # If it was not stored, they are processed in full instead.
+    if extraction is not None:
+        if result is None:
+            extraction.cancel()
+        else:
+            extraction.set_result(extracted)
+    return processed if result is not None else None
 
 
 async def insert_chunk(chunk: ProcessedChunk):
-    """Insert a processed chunk into Supabase."""
+    """Insert (or replace) a processed chunk in Supabase."""
     try:
         data = {
             "url": chunk.url,
@@ -166,7 +330,9 @@ async def insert_chunk(chunk: ProcessedChunk):
             "embedding": chunk.embedding
         }
         
-        result = supabase_client.table("site_pages").insert(data).execute()
+        # Upsert, so pages from an interrupted crawl can be stored again.
+        with traced("db upsert_chunk", db_seconds, {"operation": "upsert_chunk"}, url=chunk.url, chunk_number=chunk.chunk_number):
+            result = supabase_client.table("site_pages").upsert(data, on_conflict="url,chunk_number").execute()
         print(f"Inserted chunk {chunk.chunk_number} for {chunk.url}")
         return result
     except Exception as e:
@@ -174,91 +340,237 @@ async def insert_chunk(chunk: ProcessedChunk):
         return None
     
 
-async def process_and_store_document(url: str, markdown: str):
-    """Process a document and store its chunks in parallel."""
-    # Split into chunks
+async def process_and_store_document(url: str, markdown: str, journal: Optional[CrawlJournal] = None):
+    """Process a document and store its chunks in parallel.
+
+    Progress is recorded in the journal, if there is one. Raises an error if
+    any chunk could not be stored.
+    """
+    # Remove blocks repeated across many pages, then split into chunks
+    if dedup_enabled:
+        markdown = boilerplate.strip(url, markdown)
     chunks = chunk_text(markdown, default_chunk_size)
+    if journal:
+        journal.record(url, "chunked", chunks=len(chunks))
     
-    # Process chunks in parallel
+    # Titles and summaries from the page's headings and key sentences
+    page = PageExtractor(chunks) if title_summary_mode != "llm" else None
+
+    # Process and store chunks in parallel. Each chunk is stored as soon as
+    # it is processed, so copies of it on this page can wait for it.
     tasks = [
-        process_chunk(chunk, i, url) 
+        process_chunk(chunk, i, url, page.extract(i) if page else None)
         for i, chunk in enumerate(chunks)
     ]
-    processed_chunks = await asyncio.gather(*tasks)
-    
-    # Store chunks in parallel
-    insert_tasks = [
-        insert_chunk(chunk) 
-        for chunk in processed_chunks
-    ]
-    await asyncio.gather(*insert_tasks)
+    results = await asyncio.gather(*tasks)
+    failed = sum(1 for stored in results if stored is None)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(results)} chunks were not stored")
+
+    # The page may have had more chunks when it was stored before.
+    delete_stale_chunks(url, len(chunks))
+    await repair_duplicates(url, results)
+    if journal:
+        journal.record(url, "stored")
+
+
+def delete_stale_chunks(url: str, chunk_count: int):
+    """Delete the chunks of a page from `chunk_count` on."""
+    with traced("db delete_stale_chunks", db_seconds, {"operation": "delete_stale_chunks"}, url=url):
+        result = supabase_client.table("site_pages") \
+            .delete() \
+            .eq("url", url) \
+            .gte("chunk_number", chunk_count) \
+            .execute()
+    for row in result.data:
+        chunk_index.discard((url, row["chunk_number"]))
+    if result.data:
+        print(f"Deleted {len(result.data)} stale chunks for {url}")
+
+
+async def repair_duplicates(url: str, stored: List[ProcessedChunk]):
+    """Embed the copies of this page's chunks whose canonical chunk changed or was deleted.
+
+    Copies are stored without an embedding, so without this they could no
+    longer be found by a search. They become canonical chunks themselves.
+    """
+    canonical = {
+        chunk.chunk_number: Fingerprint(chunk.metadata["content_hash"], int(chunk.metadata["simhash"], 16))
+        for chunk in stored
+        if "duplicate_of" not in chunk.metadata
+    }
+    with traced("db select_duplicates", db_seconds, {"operation": "select_duplicates"}, url=url):
+        result = supabase_client.table("site_pages") \
+            .select("id, url, chunk_number, title, summary, content, metadata") \
+            .eq("metadata->duplicate_of->>url", url) \
+            .execute()
+
+    for row in result.data:
+        metadata = row["metadata"]
+        fingerprint = Fingerprint(metadata["content_hash"], int(metadata["simhash"], 16))
+        target = canonical.get(metadata["duplicate_of"]["chunk_number"])
+        if target is not None and chunk_index.matches(fingerprint, target):
+            continue
+
+        embedding = await get_embedding(row["content"])
+        metadata = {key: value for key, value in metadata.items() if key != "duplicate_of"}
+        metadata["embedding_model"] = f"{embedding_provider.name}:{embedding_provider.model}"
+        with traced("db update_chunk", db_seconds, {"operation": "update_chunk"}, url=row["url"], chunk_number=row["chunk_number"]):
+            supabase_client.table("site_pages") \
+                .update({"embedding": embedding, "metadata": metadata}) \
+                .eq("id", row["id"]) \
+                .execute()
+        if dedup_enabled:
+            chunk_index.add(
+                (row["url"], row["chunk_number"]),
+                fingerprint,
+                {"title": row["title"], "summary": row["summary"]},
+            )
+        print(f"Embedded chunk {row['chunk_number']} for {row['url']}: its canonical chunk on {url} changed")
 
     
-async def crawl_parallel(urls: List[str], max_concurrent: int = 5):
-    """Crawl multiple URLs in parallel with a concurrency limit."""
-    browser_config = BrowserConfig(
-        headless=True,
-        verbose=False,
-        extra_args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"],
+def load_stored_urls(page_size: int = 1000) -> Set[str]:
+    """The URLs of the pages stored in site_pages."""
+    urls: Set[str] = set()
+    start = 0
+    while True:
+        # Every stored page has a first chunk.
+        result = supabase_client.table("site_pages") \
+            .select("url") \
+            .eq("chunk_number", 0) \
+            .order("id") \
+            .range(start, start + page_size - 1) \
+            .execute()
+        urls.update(row["url"] for row in result.data)
+        if len(result.data) < page_size:
+            break
+        start += page_size
+    return urls
+
+
+def load_chunk_index(page_size: int = 1000):
+    """Add the canonical chunks stored by earlier crawls to the dedup index.
+
+    Pages that have not changed are not processed again, so changed pages
+    must be compared with the chunks that are already stored.
+    """
+    start = 0
+    while True:
+        result = supabase_client.table("site_pages") \
+            .select("url, chunk_number, title, summary, content_hash:metadata->>content_hash, simhash:metadata->>simhash") \
+            .eq("metadata->>source", "pydantic_ai_docs") \
+            .is_("metadata->duplicate_of", "null") \
+            .not_.is_("metadata->>simhash", "null") \
+            .order("id") \
+            .range(start, start + page_size - 1) \
+            .execute()
+        for row in result.data:
+            chunk_index.add(
+                (row["url"], row["chunk_number"]),
+                Fingerprint(row["content_hash"], int(row["simhash"], 16)),
+                {"title": row["title"], "summary": row["summary"]},
+            )
+        if len(result.data) < page_size:
+            break
+        start += page_size
+
+
+async def crawl_parallel(urls: Union[Iterable[str], AsyncIterable[str]], max_concurrent: int = 5) -> int:
+    """Crawl multiple URLs in parallel with a concurrency limit.
+
+    Pages are fetched over plain HTTP when possible, and with a headless
+    browser when they need JavaScript. Set FETCH_MODE=browser to always use
+    the browser. Returns the number of URLs crawled.
+
+    Progress is written to a journal (CRAWL_JOURNAL). If the crawl is
+    interrupted, the next run skips the URLs that were already stored. The
+    journal is removed once a crawl finishes without failures.
+    """
+    force_browser = os.getenv("FETCH_MODE", "tiered") == "browser"
+    fetcher = TieredFetcher(
+        force_browser=force_browser,
+        browser_pages=max_concurrent,
+        max_navigations_per_page=int(os.getenv("BROWSER_MAX_NAVIGATIONS", "50")),
     )
-    crawl_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
 
-    # Create the crawler instance
-    crawler = AsyncWebCrawler(config=browser_config)
-    await crawler.start()
+    scheduler = CrawlScheduler(
+        max_concurrent=max_concurrent,
+        per_host_limit=max_concurrent,
+        timeout=float(os.getenv("CRAWL_TIMEOUT", "300")),
+        max_retries=2,
+    )
 
-    try:
-        # Create a semaphore to limit concurrency
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def process_url(url: str):
-            async with semaphore:
-                result = await crawler.arun(
-                    url=url,
-                    config=crawl_config,
-                    session_id="session1"
-                )
-                if result.success:
-                    print(f"Successfully crawled: {url}")
-                    await process_and_store_document(url, result.markdown_v2.raw_markdown)
-                else:
-                    print(f"Failed: {url} - Error: {result.error_message}")
-        
-        # Process all URLs in parallel with limited concurrency
-        await asyncio.gather(*[process_url(url) for url in urls])
-    finally:
-        await crawler.close()
+    journal = CrawlJournal(os.getenv("CRAWL_JOURNAL", ".crawl_journal.jsonl"))
 
+    if dedup_enabled:
+        load_chunk_index()
 
-def get_urls_from_sitemap() -> List[str]:
-    """Get URLs from Pydantic AI docs sitemap."""
-    try:
-        response = requests.get(sitemap_xml_url)
-        response.raise_for_status()
-        
-        # Parse the XML
-        root = ElementTree.fromstring(response.content)
-        
-        # Extract all URLs from the sitemap
-        namespace = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        urls = [loc.text for loc in root.findall(".//ns:loc", namespace)]
-        
-        return urls
-    except Exception as e:
-        print(f"Error fetching sitemap: {e}")
-        return []
+    async with fetcher, journal:
+        # Only skip unchanged pages that are still stored.
+        fetcher.keep_validators(load_stored_urls())
+
+        async def process_url(url: str):
+            with traced("crawl page", url=url):
+                result = await fetcher.fetch(url)
+                if not result.success:
+                    raise RuntimeError(result.error)
+                if result.not_modified:
+                    print(f"Not modified, skipping: {url}")
+                    journal.record(url, "stored", not_modified=True)
+                    return
+                print(f"Successfully crawled ({result.tier}): {url}")
+                journal.record(url, "fetched", tier=result.tier)
+                await process_and_store_document(url, result.markdown, journal)
+                fetcher.mark_processed(url)
+
+        # Each worker takes the next URL as soon as it is done with the last one.
+        crawled = 0
+        failed = 0
+        async for job in scheduler.run(journal.pending(urls), process_url):
+            crawled += 1
+            if job.attempts > 1:
+                retries.inc(job.attempts - 1, operation="crawl_page")
+            if not job.success:
+                failed += 1
+                print(f"Failed: {job.url} - Error: {job.error}")
+        print(fetcher.report())
+        print(scheduler.report())
+        print(extraction_stats.report())
+        if dedup_enabled:
+            print(boilerplate.report())
+            print(chunk_index.report())
+        if journal.skipped:
+            print(f"\t- journal: {journal.skipped} URLs skipped because they were stored by an earlier run")
+
+    if not failed:
+        journal.remove()
+    return crawled + journal.skipped
+
+
+async def get_urls_from_sitemap() -> AsyncIterable[str]:
+    """Stream URLs from Pydantic AI docs sitemap.
+
+    SITEMAP_INCLUDE and SITEMAP_EXCLUDE are comma-separated regular
+    expressions used to filter the URLs.
+    """
+    include = [pattern for pattern in os.getenv("SITEMAP_INCLUDE", "").split(",") if pattern]
+    exclude = [pattern for pattern in os.getenv("SITEMAP_EXCLUDE", "").split(",") if pattern]
+    async for entry in iter_sitemap(sitemap_xml_url, include=include, exclude=exclude):
+        yield entry.loc
 
 
 async def main():
-    # Get URLs from Pydantic AI docs
-    urls = get_urls_from_sitemap()
-    if not urls:
+    configure_telemetry()
+
+    # Crawl URLs from Pydantic AI docs as they are read from the sitemap.
+    crawled = await crawl_parallel(get_urls_from_sitemap())
+    write_metrics()
+    if not crawled:
         print("No URLs found to crawl")
         return
-    
-    print(f"Found {len(urls)} URLs to crawl")
-    await crawl_parallel(urls)
+
+    print(f"Crawled {crawled} URLs")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,218 @@
+"""Duplicate and boilerplate detection for crawled documentation.
+
+Docs sites repeat the same blocks on many pages: navigation, install
+snippets, API boilerplate. Two tools keep those out of the index:
+
+- `BoilerplateStripper` removes blocks of markdown that have already been
+  seen on several other pages, before a page is chunked.
+- `ChunkIndex` finds chunks that are exact or near duplicates of a chunk
+  stored earlier. Exact duplicates have the same normalized text. Near
+  duplicates have 64-bit SimHash fingerprints within a few bits of each
+  other, found with locality-sensitive hashing on 16-bit bands.
+"""
+
+import hashlib
+import re
+
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+
+word_pattern = re.compile(r"\w+")
+whitespace_pattern = re.compile(r"\s+")
+
+simhash_bits = 64
+band_bits = 16
+
+
+def normalize_text(text: str) -> str:
+    return whitespace_pattern.sub(" ", text).strip().lower()
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """A 64-bit fingerprint. Similar texts have fingerprints that differ in few bits."""
+    words = word_pattern.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i : i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    hashes = [_hash64(shingle) for shingle in shingles]
+
+    fingerprint = 0
+    half = len(hashes) / 2
+    for bit in range(simhash_bits):
+        mask = 1 << bit
+        if sum(1 for h in hashes if h & mask) > half:
+            fingerprint |= mask
+    return fingerprint
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    content_hash: str
+    simhash: int
+
+    @classmethod
+    def of(cls, text: str) -> "Fingerprint":
+        normalized = normalize_text(text)
+        return cls(hashlib.sha1(normalized.encode()).hexdigest(), simhash(normalized))
+
+
+@dataclass
+class Duplicate:
+    key: Hashable
+    payload: Any
+    kind: str  # "exact" or "near"
+    distance: int
+
+
+class ChunkIndex:
+    """Remembers the fingerprints of canonical chunks.
+
+    Each canonical chunk has a key, such as (url, chunk_number), and a
+    payload that duplicates can use, such as its title and summary.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        if max_distance >= simhash_bits // band_bits:
+            # With more differing bits than bands, two near duplicates might
+            # not share any band, and would be missed.
+            raise ValueError(f"max_distance must be less than {simhash_bits // band_bits}")
+        self.max_distance = max_distance
+        self._exact: Dict[str, Hashable] = {}
+        self._bands: List[Dict[int, List[Hashable]]] = [{} for _ in range(simhash_bits // band_bits)]
+        self._entries: Dict[Hashable, Tuple[Fingerprint, Any]] = {}
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_values(self, fingerprint: int):
+        mask = (1 << band_bits) - 1
+        for band in range(len(self._bands)):
+            yield band, (fingerprint >> (band * band_bits)) & mask
+
+    def find(self, fingerprint: Fingerprint, key: Optional[Hashable] = None) -> Optional[Duplicate]:
+        """Find a canonical chunk that `fingerprint` duplicates, other than `key` itself."""
+        canonical = self._exact.get(fingerprint.content_hash)
+        if canonical is not None and canonical != key:
+            return Duplicate(canonical, self._entries[canonical][1], "exact", 0)
+
+        best: Optional[Duplicate] = None
+        seen: Set[Hashable] = set()
+        for band, value in self._band_values(fingerprint.simhash):
+            for candidate in self._bands[band].get(value, ()):
+                if candidate == key or candidate in seen:
+                    continue
+                seen.add(candidate)
+                other, payload = self._entries[candidate]
+                distance = bin(fingerprint.simhash ^ other.simhash).count("1")
+                if distance <= self.max_distance and (best is None or distance < best.distance):
+                    best = Duplicate(candidate, payload, "near", distance)
+        return best
+
+    def matches(self, fingerprint: Fingerprint, other: Fingerprint) -> bool:
+        """Whether two fingerprints are exact or near duplicates of each other."""
+        if fingerprint.content_hash == other.content_hash:
+            return True
+        return bin(fingerprint.simhash ^ other.simhash).count("1") <= self.max_distance
+
+    def add(self, key: Hashable, fingerprint: Fingerprint, payload: Any = None):
+        """Add a canonical chunk, replacing an earlier one with the same key."""
+        if key in self._entries:
+            self.remove(key)
+        self._entries[key] = (fingerprint, payload)
+        self._exact.setdefault(fingerprint.content_hash, key)
+        for band, value in self._band_values(fingerprint.simhash):
+            self._bands[band].setdefault(value, []).append(key)
+
+    def discard(self, key: Hashable):
+        """Remove a canonical chunk, if it is in the index."""
+        if key in self._entries:
+            self.remove(key)
+
+    def remove(self, key: Hashable):
+        fingerprint, _ = self._entries.pop(key)
+        if self._exact.get(fingerprint.content_hash) == key:
+            del self._exact[fingerprint.content_hash]
+        for band, value in self._band_values(fingerprint.simhash):
+            keys = self._bands[band].get(value, [])
+            if key in keys:
+                keys.remove(key)
+
+    def record(self, duplicate: Duplicate):
+        if duplicate.kind == "exact":
+            self.exact_duplicates += 1
+        else:
+            self.near_duplicates += 1
+
+    def report(self) -> str:
+        return (
+            f"\t- dedup: {len(self)} canonical chunks, {self.exact_duplicates} exact and "
+            f"{self.near_duplicates} near duplicates skipped"
+        )
+
+
+def split_blocks(markdown: str) -> List[str]:
+    """Split markdown into blocks at blank lines, keeping fenced code blocks whole."""
+    blocks: List[str] = []
+    current: List[str] = []
+    in_fence = False
+    for line in markdown.split("\n"):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+class BoilerplateStripper:
+    """Removes blocks that appear on many pages.
+
+    A block is removed once it has been seen on `min_pages` other pages.
+    The first pages crawled in a run keep their copy, but which pages those
+    are depends on crawl order, and nothing keeps a copy stored: if those
+    pages later change or are not crawled again, the block may no longer be
+    stored anywhere. Short blocks, such as headings, are always kept.
+    """
+
+    def __init__(self, min_pages: int = 3, min_block_length: int = 50):
+        self.min_pages = min_pages
+        self.min_block_length = min_block_length
+        self._pages: Dict[str, Set[str]] = {}
+        self.blocks_stripped = 0
+        self.characters_stripped = 0
+
+    def strip(self, url: str, markdown: str) -> str:
+        kept = []
+        for block in split_blocks(markdown):
+            if len(block) < self.min_block_length:
+                kept.append(block)
+                continue
+            block_hash = hashlib.sha1(normalize_text(block).encode()).hexdigest()
+            pages = self._pages.setdefault(block_hash, set())
+            if len(pages - {url}) >= self.min_pages:
+                self.blocks_stripped += 1
+                self.characters_stripped += len(block)
+                continue
+            if len(pages) <= self.min_pages:
+                pages.add(url)
+            kept.append(block)
+        return "\n\n".join(kept)
+
+    def report(self) -> str:
+        return (
+            f"\t- boilerplate: {self.blocks_stripped} blocks "
+            f"({self.characters_stripped} characters) stripped"
+        )
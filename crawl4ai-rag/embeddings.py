@@ -0,0 +1,157 @@
+import asyncio
+import functools
+import os
+
+from batcher import MicroBatcher
+from concurrent.futures import ThreadPoolExecutor
+from telemetry import embedding_seconds, embedding_texts, traced
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+class EmbeddingProvider:
+    """Base class for embedding providers.
+
+    Subclasses implement `embed`, which embeds a batch of texts. Callers
+    that embed one text at a time use `embed_one`: concurrent calls are
+    collected for up to `max_wait` seconds (or until `batch_size` texts are
+    waiting) and embedded together in one batch.
+    """
+
+    name: str = "base"
+    model: str = ""
+    dimensions: int = 0
+
+    def __init__(self, batch_size: int = 64, max_wait: float = 0.01):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self._batcher = MicroBatcher(self._embed_batch, batch_size, max_wait)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def embed_one(self, text: str) -> List[float]:
+        return await self._batcher.submit(text)
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests += len(texts)
+        self.batches += 1
+        with traced(
+            "embedding batch", embedding_seconds, {"provider": self.name}, model=self.model, batch_size=len(texts)
+        ):
+            vectors = await self.embed(texts)
+        embedding_texts.inc(len(texts), provider=self.name)
+        return vectors
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        openai_client: "AsyncOpenAI",
+        model: str = "text-embedding-3-small",
+        dimensions: int = 1536,
+        batch_size: int = 256,
+    ):
+        super().__init__(batch_size=batch_size)
+        self.openai_client = openai_client
+        self.model = model
+        self.dimensions = dimensions
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            kwargs = {}
+            # Only the text-embedding-3 models can return fewer dimensions.
+            if self.model.startswith("text-embedding-3"):
+                kwargs["dimensions"] = self.dimensions
+            response = await self.openai_client.embeddings.create(
+                model=self.model,
+                input=texts[start : start + self.batch_size],
+                **kwargs,
+            )
+            vectors.extend(item.embedding for item in response.data)
+        return vectors
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from a sentence-transformers model running on the local CPU.
+
+    Works offline once the model has been downloaded. Inference runs in a
+    background thread, and PyTorch uses `threads` CPU threads for each batch.
+    Requires `pip install sentence-transformers`.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        batch_size: int = 32,
+        threads: Optional[int] = None,
+    ):
+        super().__init__(batch_size=batch_size)
+        import torch
+
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(threads or os.cpu_count() or 1)
+        self.model = model
+        self._model = SentenceTransformer(model, device="cpu")
+        self.dimensions = self._model.get_sentence_embedding_dimension()
+        # One inference thread. PyTorch parallelizes each batch itself.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return vectors.tolist()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._encode, texts)
+
+
+@functools.cache
+def get_local_embedding_provider(model: str, threads: Optional[int] = None) -> LocalEmbeddingProvider:
+    """Load a local model once per process."""
+    return LocalEmbeddingProvider(model=model, threads=threads)
+
+
+def get_embedding_provider(openai_client: Optional["AsyncOpenAI"] = None) -> EmbeddingProvider:
+    """Get the embedding provider configured in the environment.
+
+    EMBEDDING_PROVIDER is "openai" (default) or "local". EMBEDDING_MODEL and
+    EMBEDDING_DIMENSIONS override the model and, for OpenAI, the number of
+    dimensions. The dimensions must match the `site_pages` schema.
+    """
+    provider = os.getenv("EMBEDDING_PROVIDER", "openai")
+    model = os.getenv("EMBEDDING_MODEL")
+
+    if provider == "local":
+        threads = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+        return get_local_embedding_provider(model or "sentence-transformers/all-MiniLM-L6-v2", threads)
+
+    if provider == "openai":
+        if openai_client is None:
+            from openai import AsyncOpenAI
+
+            openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return OpenAIEmbeddingProvider(
+            openai_client,
+            model=model or "text-embedding-3-small",
+            dimensions=int(os.getenv("EMBEDDING_DIMENSIONS", "1536")),
+        )
+
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {provider}")
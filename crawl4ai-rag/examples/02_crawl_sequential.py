@@ -1,17 +1,21 @@
 import asyncio
 import crawl4ai
-import requests
+import os
+import sys
 
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
-from typing import List
-from xml.etree import ElementTree
+from typing import AsyncIterable
+
+# Import shared crawler modules from the parent directory.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sitemap import iter_sitemap
 
 
 sitemap_xml_url = "https://ai.pydantic.dev/sitemap.xml"
 
 
-async def crawl_sequential(urls: List[str]):
+async def crawl_sequential(urls: AsyncIterable[str]) -> int:
     print("\n=== Crawl Sequential ===")
 
     browser_config = BrowserConfig(
@@ -29,8 +33,10 @@ async def crawl_sequential(urls: List[str]):
 
     try:
         session_id = "session_1"
+        crawled = 0
 
-        for url in urls:
+        async for url in urls:
+            crawled += 1
             result = await crawler.arun(url=url, config=crawl_config, session_id=session_id)
             if result.success:
                 print(f"Successfully crawled: {url}")
@@ -43,31 +49,19 @@ async def crawl_sequential(urls: List[str]):
         await crawler.close()
         print("\nCrawler closed.")
 
+    return crawled
 
-def get_urls():
-    try:
-        response = requests.get(sitemap_xml_url)
-        response.raise_for_status()
-
-        root = ElementTree.fromstring(response.content)
-
-        ns = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        urls = [loc.text for loc in root.findall(".//ns:loc", ns)]
 
-        return urls
-    except Exception as e:
-        print(f"Failed to fetch sitemap.xml: {e}")
-        return []
+async def get_urls() -> AsyncIterable[str]:
+    async for entry in iter_sitemap(sitemap_xml_url):
+        yield entry.loc
 
 
 async def main():
-    urls = get_urls()
-    if urls:
-        print(f"Found {len(urls)} URLs to crawl.")
-        await crawl_sequential(urls)
-    else:
+    crawled = await crawl_sequential(get_urls())
+    if not crawled:
         print("No URLs to crawl.")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
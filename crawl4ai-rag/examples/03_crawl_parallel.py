@@ -1,16 +1,22 @@
 import asyncio
-import requests
+import os
+import sys
 
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
-from typing import List
-from xml.etree import ElementTree
+from typing import AsyncIterable
+
+# Import shared crawler modules from the parent directory.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_pool import PagePool
+from scheduler import CrawlScheduler
+from sitemap import iter_sitemap
 
 
 sitemap_xml_url = "https://ai.pydantic.dev/sitemap.xml"
 max_concurrent = 10
 
 
-async def crawl_parallel(urls: List[str], max_concurrent: int = 3):
+async def crawl_parallel(urls: AsyncIterable[str], max_concurrent: int = 3) -> int:
     print("\n=== Crawl Parallel ===")
 
     browser_config = BrowserConfig(
@@ -26,66 +32,62 @@ async def crawl_parallel(urls: List[str], max_concurrent: int = 3):
     await crawler.start()
     print("\nCrawler started.")
 
+    # Concurrent crawls borrow pages from a fixed-size pool instead of opening
+    # (and never closing) a new page per URL.
+    page_pool = PagePool(crawler, size=max_concurrent)
+
+    # A sliding window of workers takes the next URL as soon as one finishes,
+    # so a slow page never stalls the others.
+    scheduler = CrawlScheduler(
+        max_concurrent=max_concurrent,
+        per_host_limit=max_concurrent,
+        timeout=60,
+        max_retries=2,
+    )
+
+    async def crawl(url: str):
+        result = await page_pool.arun(url, crawl_config)
+        if not result.success:
+            raise RuntimeError(result.error_message)
+        return result
+
     try:
         success_count = 0
         fail_count = 0
 
-        # Chunk the URLs in batches.
-        for idx_1 in range(0, len(urls), max_concurrent):
-            batch = urls[idx_1 : idx_1 + max_concurrent]
-            tasks = []
-
-            for idx_2, url in enumerate(batch):
-                # Unique session_id per concurrent sub-task
-                session_id = f"parallel_session_{idx_1}_{idx_2}"
-                task = crawler.arun(url=url, config=crawl_config, session_id=session_id)
-                tasks.append(task)
-
-            # Gather results
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Evaluate results
-            for url, result in zip(batch, results):
-                if result.success:
-                    success_count += 1
-                else:
-                    if isinstance(result, Exception):
-                        print(f"Error crawling {url}: {result}")
-                    fail_count += 1
+        # Report progress as each result completes. URLs are crawled as they
+        # are read from the sitemap, so the total is not known up front.
+        async for job in scheduler.run(urls, crawl):
+            if job.success:
+                success_count += 1
+                print(f"[{success_count + fail_count}] Crawled {job.url} in {job.seconds:.2f}s")
+            else:
+                fail_count += 1
+                print(f"[{success_count + fail_count}] Error crawling {job.url}: {job.error}")
 
         print(f"\nSummary:")
         print(f"\t- Successfully crawled: {success_count}")
         print(f"\t- Failed: {fail_count}")
+        print(scheduler.report())
+        print(page_pool.report())
     finally:
         print("\nClosing crawler...")
         await crawler.close()
         print("\nCrawler closed.")
 
+    return success_count + fail_count
 
-def get_urls():
-    try:
-        response = requests.get(sitemap_xml_url)
-        response.raise_for_status()
-        
-        root = ElementTree.fromstring(response.content)
-        
-        ns = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        urls = [loc.text for loc in root.findall(".//ns:loc", ns)]
-        
-        return urls
-    except Exception as e:
-        print(f"Failed to fetch sitemap.xml: {e}")
-        return []        
+
+async def get_urls() -> AsyncIterable[str]:
+    async for entry in iter_sitemap(sitemap_xml_url):
+        yield entry.loc
 
 
 async def main():
-    urls = get_urls()
-    if urls:
-        print(f"Found {len(urls)} URLs to crawl.")
-        await crawl_parallel(urls, max_concurrent=max_concurrent)
-    else:
+    crawled = await crawl_parallel(get_urls(), max_concurrent=max_concurrent)
+    if not crawled:
         print("No URLs to crawl.")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""Local title and summary extraction for documentation chunks.
+
+The title of a chunk is the path of markdown headings it falls under, for
+example "Agents - Running Agents - Streaming". The summary is made of the
+chunk's key sentences, ranked by TF-IDF against the other chunks of the
+same page. Chunks without a heading or with little prose (mostly code or
+tables) are not `confident`, and should be summarized by the LLM instead.
+"""
+
+import math
+import re
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+heading_pattern = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+link_pattern = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+sentence_pattern = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9`\"'(\[])")
+word_pattern = re.compile(r"[a-z][a-z0-9_]+")
+
+max_title_length = 200
+max_summary_length = 300
+min_prose_words = 30
+
+
+@dataclass
+class Extraction:
+    title: str
+    summary: str
+    confident: bool
+
+
+def clean_inline(text: str) -> str:
+    """Remove markdown links, permalink markers and emphasis from a line."""
+    text = link_pattern.sub(r"\1", text)
+    text = text.replace("¶", "").replace("**", "").replace("`", "")
+    return text.strip()
+
+
+def _walk_lines(chunk: str):
+    """Yield (heading level, heading text) or (0, prose line), skipping code blocks."""
+    in_fence = False
+    for line in chunk.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_fence = not in_fence
+            continue
+        if in_fence or not stripped:
+            continue
+        match = heading_pattern.match(stripped)
+        if match:
+            yield len(match.group(1)), clean_inline(match.group(2))
+        elif not stripped.startswith(("|", ">", "<", "---", "===")):
+            yield 0, clean_inline(re.sub(r"^([-*+]|\d+\.)\s+", "", stripped))
+
+
+def _title(path: List[Tuple[int, str]]) -> str:
+    names = [name for _, name in path if name]
+    if len(names) > 3:
+        names = [names[0]] + names[-2:]
+    return " - ".join(names)[:max_title_length]
+
+
+def _sentences(prose: List[str]) -> List[str]:
+    sentences = []
+    for paragraph in prose:
+        for sentence in sentence_pattern.split(paragraph):
+            if 5 <= len(sentence.split()) <= 60:
+                sentences.append(sentence.strip())
+    return sentences
+
+
+class PageExtractor:
+    """Titles and summaries for the chunks of one page."""
+
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+        self._titles: List[str] = []
+        self._prose: List[List[str]] = []
+
+        # Follow the heading path through the page, chunk by chunk.
+        # A chunk is titled by the section it starts in.
+        path: List[Tuple[int, str]] = []
+        for chunk in chunks:
+            title = None
+            prose = []
+            for level, text in _walk_lines(chunk):
+                if level:
+                    path = [(l, name) for l, name in path if l < level] + [(level, text)]
+                    if title is None:
+                        title = _title(path)
+                else:
+                    if title is None and path:
+                        title = _title(path)
+                    prose.append(text)
+            self._titles.append(title if title is not None else _title(path))
+            self._prose.append(prose)
+
+        # Document frequencies of words across the page's chunks.
+        self._document_frequency: Counter = Counter()
+        for prose in self._prose:
+            self._document_frequency.update(set(word_pattern.findall(" ".join(prose).lower())))
+
+    def _idf(self, word: str) -> float:
+        return math.log((1 + len(self.chunks)) / (1 + self._document_frequency[word])) + 1
+
+    def summary(self, chunk_number: int, max_sentences: int = 2) -> str:
+        sentences = _sentences(self._prose[chunk_number])
+        if not sentences:
+            return ""
+
+        scores = []
+        for position, sentence in enumerate(sentences):
+            words = word_pattern.findall(sentence.lower())
+            counts = Counter(words)
+            score = sum(count * self._idf(word) for word, count in counts.items()) / math.sqrt(len(words) or 1)
+            # Docs usually lead with the point of a section.
+            if position == 0:
+                score *= 1.2
+            scores.append((score, position))
+
+        best = sorted(position for _, position in sorted(scores, reverse=True)[:max_sentences])
+        summary = " ".join(sentences[position] for position in best)
+        if len(summary) > max_summary_length:
+            summary = summary[:max_summary_length].rsplit(" ", 1)[0] + "..."
+        return summary
+
+    def extract(self, chunk_number: int) -> Extraction:
+        title = self._titles[chunk_number]
+        summary = self.summary(chunk_number)
+        prose_words = sum(len(line.split()) for line in self._prose[chunk_number])
+        confident = bool(title) and bool(summary) and prose_words >= min_prose_words
+        return Extraction(title=title, summary=summary, confident=confident)
+
+
+class ExtractionStats:
+    def __init__(self):
+        self.chunks = 0
+        self.local = 0
+        self.llm_chunks = 0
+        self.llm_requests = 0
+
+    def report(self) -> str:
+        if not self.chunks:
+            return "\t- titles and summaries: no chunks"
+        saved = 1 - self.llm_requests / self.chunks
+        return (
+            f"\t- titles and summaries: {self.chunks} chunks, {self.local} extracted locally, "
+            f"{self.llm_chunks} by the LLM in {self.llm_requests} requests "
+            f"({saved:.0%} fewer LLM calls than one per chunk)"
+        )
@@ -0,0 +1,260 @@
+import asyncio
+import httpx
+import json
+import os
+import psutil
+import re
+import time
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+from dataclasses import dataclass
+from page_pool import PagePool, browser_processes, cpu_seconds, rss_mb
+from telemetry import cache_requests, fetch_seconds, fetches, traced
+from typing import Dict, Optional, Set
+
+
+# Pages that render their content with JavaScript usually ship one of these.
+js_required_patterns = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in [
+        r"<noscript>[^<]*(enable|requires?) javascript",
+        r"<div id=\"(root|app|__next|__nuxt)\">\s*</div>",
+        r"<app-root>\s*</app-root>",
+    ]
+]
+
+
+@dataclass
+class FetchResult:
+    url: str
+    tier: str
+    markdown: Optional[str] = None
+    not_modified: bool = False
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.markdown is not None or self.not_modified
+
+
+@dataclass
+class TierStats:
+    pages: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+    first_started: Optional[float] = None
+    last_finished: Optional[float] = None
+
+    def record(self, started: float, success: bool):
+        finished = time.perf_counter()
+        if success:
+            self.pages += 1
+        else:
+            self.failures += 1
+        self.seconds += finished - started
+        self.first_started = started if self.first_started is None else min(self.first_started, started)
+        self.last_finished = finished if self.last_finished is None else max(self.last_finished, finished)
+
+    @property
+    def pages_per_second(self) -> float:
+        if self.first_started is None or self.last_finished <= self.first_started:
+            return 0.0
+        return self.pages / (self.last_finished - self.first_started)
+
+
+class TieredFetcher:
+    """Fetch pages with a plain HTTP GET first, and a headless browser only when needed.
+
+    The HTTP tier uses a pooled client and conditional requests (ETag and
+    Last-Modified), and converts HTML to markdown locally. A page is escalated
+    to the browser tier when the HTTP request fails, the page looks like it
+    needs JavaScript, or the markdown looks incomplete.
+
+    Set `force_browser` to skip the HTTP tier entirely.
+    """
+
+    def __init__(
+        self,
+        validators_path: str = ".crawl_validators.json",
+        max_connections: int = 20,
+        min_markdown_length: int = 500,
+        force_browser: bool = False,
+        browser_pages: int = 5,
+        max_navigations_per_page: int = 50,
+    ):
+        self.validators_path = validators_path
+        self.max_connections = max_connections
+        self.min_markdown_length = min_markdown_length
+        self.force_browser = force_browser
+        self.browser_pages = browser_pages
+        self.max_navigations_per_page = max_navigations_per_page
+        self.stats: Dict[str, TierStats] = {"http": TierStats(), "browser": TierStats()}
+        self.validators: Dict[str, Dict[str, str]] = {}
+        self._pending_validators: Dict[str, Dict[str, str]] = {}
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._crawler: Optional[AsyncWebCrawler] = None
+        self._page_pool: Optional[PagePool] = None
+        self._crawler_lock = asyncio.Lock()
+        self._markdown_generator = DefaultMarkdownGenerator()
+        self._crawl_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
+
+    async def __aenter__(self):
+        if os.path.exists(self.validators_path):
+            with open(self.validators_path) as f:
+                self.validators = json.load(f)
+        self._http_client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._http_client.aclose()
+        if self._crawler is not None:
+            await self._crawler.close()
+        with open(self.validators_path, "w") as f:
+            json.dump(self.validators, f)
+
+    def keep_validators(self, urls: Set[str]):
+        """Forget the validators of pages other than `urls`, so they are fetched in full.
+
+        Pass the pages that are still stored. A page whose rows were deleted,
+        for example when the table was recreated, must not be skipped as not
+        modified.
+        """
+        self.validators = {url: validators for url, validators in self.validators.items() if url in urls}
+
+    def mark_processed(self, url: str):
+        """Remember the page's validators once it has been processed successfully.
+
+        Later crawls send them with the request, and skip the page if the
+        server says it has not been modified.
+        """
+        validators = self._pending_validators.pop(url, None)
+        if validators:
+            self.validators[url] = validators
+
+    async def fetch(self, url: str) -> FetchResult:
+        if not self.force_browser:
+            with traced("fetch", fetch_seconds, {"tier": "http"}, url=url) as span:
+                result = await self.fetch_http(url)
+                span.set_attribute("escalated", result is None)
+            if result is not None:
+                self._record(result)
+                return result
+        with traced("fetch", fetch_seconds, {"tier": "browser"}, url=url):
+            result = await self.fetch_browser(url)
+        self._record(result)
+        return result
+
+    def _record(self, result: FetchResult):
+        outcome = "not_modified" if result.not_modified else ("ok" if result.success else "error")
+        fetches.inc(tier=result.tier, outcome=outcome)
+        if result.tier == "http" and result.url in self.validators:
+            cache_requests.inc(cache="http_validators", result="hit" if result.not_modified else "miss")
+
+    async def fetch_http(self, url: str) -> Optional[FetchResult]:
+        """Fetch a page with HTTP. Returns None if the page should go to the browser."""
+        started = time.perf_counter()
+        stats = self.stats["http"]
+
+        headers = {}
+        validators = self.validators.get(url, {})
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            response = await self._http_client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            print(f"HTTP fetch failed, escalating to browser: {url} - {e}")
+            stats.record(started, success=False)
+            return None
+
+        if response.status_code == 304:
+            stats.record(started, success=True)
+            return FetchResult(url=url, tier="http", not_modified=True)
+
+        html = response.text
+        if (
+            response.status_code != 200
+            or "html" not in response.headers.get("content-type", "")
+            or any(pattern.search(html) for pattern in js_required_patterns)
+        ):
+            stats.record(started, success=False)
+            return None
+
+        # Converting HTML to markdown is CPU-bound, so keep it off the event loop.
+        markdown = await asyncio.to_thread(self.html_to_markdown, html, url)
+        if len(markdown) < self.min_markdown_length:
+            stats.record(started, success=False)
+            return None
+
+        new_validators = {}
+        if "etag" in response.headers:
+            new_validators["etag"] = response.headers["etag"]
+        if "last-modified" in response.headers:
+            new_validators["last_modified"] = response.headers["last-modified"]
+        self._pending_validators[url] = new_validators
+
+        stats.record(started, success=True)
+        return FetchResult(url=url, tier="http", markdown=markdown)
+
+    def html_to_markdown(self, html: str, url: str) -> str:
+        result = self._markdown_generator.generate_markdown(html, base_url=url)
+        return result.raw_markdown
+
+    async def fetch_browser(self, url: str) -> FetchResult:
+        started = time.perf_counter()
+        page_pool = await self._get_page_pool()
+        result = await page_pool.arun(url, self._crawl_config)
+        self.stats["browser"].record(started, success=result.success)
+        if result.success:
+            return FetchResult(url=url, tier="browser", markdown=result.markdown_v2.raw_markdown)
+        return FetchResult(url=url, tier="browser", error=result.error_message)
+
+    async def _get_page_pool(self) -> PagePool:
+        """Start the browser the first time a page needs it."""
+        async with self._crawler_lock:
+            if self._crawler is None:
+                browser_config = BrowserConfig(
+                    headless=True,
+                    verbose=False,
+                    extra_args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"],
+                )
+                crawler = AsyncWebCrawler(config=browser_config)
+                await crawler.start()
+                self._crawler = crawler
+                self._page_pool = PagePool(
+                    crawler,
+                    size=self.browser_pages,
+                    max_navigations=self.max_navigations_per_page,
+                )
+        return self._page_pool
+
+    def report(self) -> str:
+        """Summarize pages/sec per tier, and CPU and RSS of this process and the browser."""
+        lines = ["\nFetch summary:"]
+        for tier, stats in self.stats.items():
+            attempts = stats.pages + stats.failures
+            mean_latency = stats.seconds / attempts if attempts else 0.0
+            lines.append(
+                f"\t- {tier}: {stats.pages} pages, {stats.failures} failed/escalated, "
+                f"{stats.pages_per_second:.1f} pages/sec, {mean_latency:.2f}s mean latency"
+            )
+
+        # The HTTP tier runs in this process. The browser tier runs in child processes.
+        process = psutil.Process()
+        browser = browser_processes()
+        lines.append(f"\t- http process: {cpu_seconds([process]):.1f}s CPU, {rss_mb([process]):.0f} MB RSS")
+        lines.append(f"\t- browser processes: {cpu_seconds(browser):.1f}s CPU, {rss_mb(browser):.0f} MB RSS")
+        if self._page_pool is not None:
+            lines.append(self._page_pool.report())
+        return "\n".join(lines)
+
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import time
+
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Set, Union
+
+
+# The states a URL goes through, in order.
+states = ("fetched", "chunked", "stored")
+
+
+class CrawlJournal:
+    """Append-only journal of per-URL crawl progress.
+
+    Each line is a JSON record of a URL reaching a state. When a crawl is
+    restarted, the journal is replayed and URLs that were already stored are
+    skipped.
+
+    Records are buffered and written with one fsync per batch: when
+    `flush_every` records are waiting, or every `flush_interval` seconds.
+    A crash can lose at most the last unflushed batch, which only means
+    those URLs are crawled again.
+    """
+
+    def __init__(self, path: str = ".crawl_journal.jsonl", flush_every: int = 100, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.states: Dict[str, str] = {}
+        self.skipped = 0
+        self._buffer: List[str] = []
+        self._file = None
+        self._flusher: Optional[asyncio.Task] = None
+        # Flushes started by `record`, kept so they are awaited before closing.
+        self._flushes: Set[asyncio.Task] = set()
+        self._flush_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        self.load()
+        self._file = open(self.path, "a")
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # Don't append to a line that was cut off by a crash.
+            self._file.write("\n")
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Holding the lock, the flusher can't be cancelled in the middle of a write.
+        async with self._flush_lock:
+            self._flusher.cancel()
+        await asyncio.gather(self._flusher, *self._flushes, return_exceptions=True)
+        await self.flush()
+        self._file.close()
+
+    def load(self):
+        """Replay the journal to find the latest state of each URL."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be cut off if the crawler died mid-write.
+                    continue
+                self.states[record["url"]] = record["state"]
+        if self.states:
+            stored = sum(1 for state in self.states.values() if state == "stored")
+            print(f"Resuming crawl from {self.path}: {stored} of {len(self.states)} URLs already stored")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def is_done(self, url: str) -> bool:
+        return self.states.get(url) == "stored"
+
+    def record(self, url: str, state: str, **details):
+        """Record that a URL reached a state."""
+        self.states[url] = state
+        self._buffer.append(json.dumps({"url": url, "state": state, "at": time.time(), **details}) + "\n")
+        if len(self._buffer) >= self.flush_every:
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            lines, self._buffer = self._buffer, []
+            await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: List[str]):
+        self._file.writelines(lines)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def pending(self, urls: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+        """Yield only the URLs that have not been stored yet."""
+        if not isinstance(urls, AsyncIterable):
+            urls = iterate(urls)
+        async for url in urls:
+            if self.is_done(url):
+                self.skipped += 1
+            else:
+                yield url
+
+    def remove(self):
+        """Delete the journal, so the next crawl starts fresh."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def iterate(items: Iterable[str]) -> AsyncIterator[str]:
+    for item in items:
+        yield item
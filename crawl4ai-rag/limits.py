@@ -0,0 +1,162 @@
+"""Admission control for the API: per-tenant and total concurrency limits.
+
+Each tenant can run `per_tenant` agent turns at once, and the process runs
+at most `max_concurrent` in total. Requests over those limits wait in a
+short queue. When the queue is full, or a request has waited for
+`queue_timeout` seconds, it is rejected right away with a `Rejected` error
+instead of piling up:
+
+    429  the tenant has too many requests waiting
+    503  the server as a whole is at capacity
+
+Both carry a Retry-After estimate based on how long recent turns took.
+"""
+
+import asyncio
+import math
+import time
+
+from collections import Counter
+from typing import Dict
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(reason)
+
+
+async def acquire_within(semaphore: asyncio.Semaphore, timeout: float) -> bool:
+    """Acquire `semaphore` within `timeout` seconds. Returns False, holding nothing, on timeout.
+
+    Unlike `asyncio.wait_for(semaphore.acquire(), timeout)` before Python
+    3.12, a permit granted just as the timeout expires is never lost.
+    """
+    acquiring = asyncio.ensure_future(semaphore.acquire())
+    try:
+        await asyncio.wait({acquiring}, timeout=timeout)
+    except BaseException:
+        # The caller was cancelled. Give back a permit that was granted meanwhile.
+        if acquiring.done() and not acquiring.cancelled():
+            semaphore.release()
+        else:
+            acquiring.cancel()
+        raise
+    if not acquiring.done():
+        # Semaphore.acquire gives back a permit it was granted when it is cancelled.
+        acquiring.cancel()
+        return False
+    return True
+
+
+class Slot:
+    """A held place in the limiter. `release` can be called more than once."""
+
+    def __init__(self, limiter: "TenantLimiter", tenant: str):
+        self.limiter = limiter
+        self.tenant = tenant
+        self.acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.limiter._release(self)
+
+
+class TenantLimiter:
+    def __init__(
+        self,
+        max_concurrent: int = 32,
+        per_tenant: int = 4,
+        max_queue: int = 64,
+        per_tenant_queue: int = 8,
+        queue_timeout: float = 10.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_tenant = per_tenant
+        self.max_queue = max_queue
+        self.per_tenant_queue = per_tenant_queue
+        self.queue_timeout = queue_timeout
+        self._total = asyncio.Semaphore(max_concurrent)
+        self._tenants: Dict[str, asyncio.Semaphore] = {}
+        self._waiting: Counter = Counter()
+        self._active: Counter = Counter()
+        # Moving average of how long a slot is held, for Retry-After.
+        self._hold_seconds = 1.0
+        self.rejected: Counter = Counter()
+
+    @property
+    def active(self) -> int:
+        return sum(self._active.values())
+
+    @property
+    def waiting(self) -> int:
+        return sum(self._waiting.values())
+
+    def _retry_after(self, waiting: int, slots: int) -> int:
+        return max(1, math.ceil(self._hold_seconds * (waiting + 1) / slots))
+
+    def _reject(self, status: int, reason: str, waiting: int, slots: int):
+        self.rejected[reason] += 1
+        raise Rejected(status, reason, self._retry_after(waiting, slots))
+
+    async def acquire(self, tenant: str) -> Slot:
+        """Wait for a slot for `tenant`, or raise `Rejected`."""
+        if self._waiting[tenant] >= self.per_tenant_queue:
+            self._reject(429, "tenant queue full", self._waiting[tenant], self.per_tenant)
+        if self.waiting >= self.max_queue:
+            self._reject(503, "server queue full", self.waiting, self.max_concurrent)
+
+        tenant_semaphore = self._tenants.get(tenant)
+        if tenant_semaphore is None:
+            tenant_semaphore = self._tenants[tenant] = asyncio.Semaphore(self.per_tenant)
+
+        deadline = time.monotonic() + self.queue_timeout
+        self._waiting[tenant] += 1
+        admitted = False
+        try:
+            # The tenant's own limit first, so one tenant's queue never holds total slots.
+            if not await acquire_within(tenant_semaphore, self.queue_timeout):
+                self._reject(429, "tenant queue timeout", self._waiting[tenant], self.per_tenant)
+            try:
+                acquired = await acquire_within(self._total, max(0.0, deadline - time.monotonic()))
+            except BaseException:
+                tenant_semaphore.release()
+                raise
+            if not acquired:
+                tenant_semaphore.release()
+                self._reject(503, "server queue timeout", self.waiting, self.max_concurrent)
+            admitted = True
+        finally:
+            self._waiting[tenant] -= 1
+            if not self._waiting[tenant]:
+                del self._waiting[tenant]
+                if not admitted and tenant not in self._active:
+                    # Every request of this tenant was turned away.
+                    self._tenants.pop(tenant, None)
+
+        self._active[tenant] += 1
+        return Slot(self, tenant)
+
+    def _release(self, slot: Slot):
+        self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * (time.monotonic() - slot.acquired_at)
+        self._active[slot.tenant] -= 1
+        if not self._active[slot.tenant]:
+            del self._active[slot.tenant]
+        self._total.release()
+        self._tenants[slot.tenant].release()
+        if slot.tenant not in self._active and slot.tenant not in self._waiting:
+            del self._tenants[slot.tenant]
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "tenants": len(self._active),
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,123 @@
+import asyncio
+import psutil
+import time
+
+from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class PageSlot:
+    """One browser page in the pool. Each generation is a fresh crawl4ai session."""
+
+    index: int
+    generation: int = 0
+    navigations: int = 0
+
+    @property
+    def session_id(self) -> str:
+        return f"pool_{self.index}_{self.generation}"
+
+
+class PagePool:
+    """Fixed-size pool of browser pages shared by concurrent crawls.
+
+    Each crawl borrows a page, and gives it back when it is done. A page is
+    closed and replaced after `max_navigations` crawls to cap memory growth,
+    and after any failed crawl so a broken page is never reused.
+    """
+
+    def __init__(self, crawler: AsyncWebCrawler, size: int = 5, max_navigations: int = 50):
+        self.crawler = crawler
+        self.size = size
+        self.max_navigations = max_navigations
+        self.navigations = 0
+        self.recycles = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.started = time.perf_counter()
+        self._slots: asyncio.Queue[PageSlot] = asyncio.Queue()
+        for index in range(size):
+            self._slots.put_nowait(PageSlot(index=index))
+
+    async def arun(self, url: str, config: CrawlerRunConfig):
+        """Crawl a URL with a page borrowed from the pool."""
+        wait_started = time.perf_counter()
+        slot = await self._slots.get()
+        busy_started = time.perf_counter()
+        self.wait_seconds += busy_started - wait_started
+
+        success = False
+        try:
+            result = await self.crawler.arun(url=url, config=config, session_id=slot.session_id)
+            success = result.success
+            return result
+        finally:
+            self.navigations += 1
+            slot.navigations += 1
+            if not success:
+                self.failures += 1
+            if not success or slot.navigations >= self.max_navigations:
+                await self._recycle(slot)
+            self.busy_seconds += time.perf_counter() - busy_started
+            self._slots.put_nowait(slot)
+
+    async def _recycle(self, slot: PageSlot):
+        """Close the slot's page. The next crawl in this slot opens a new one."""
+        try:
+            await self.crawler.crawler_strategy.kill_session(slot.session_id)
+        except Exception as e:
+            print(f"Error closing browser page {slot.session_id}: {e}")
+        slot.generation += 1
+        slot.navigations = 0
+        self.recycles += 1
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of page time spent crawling since the pool was created."""
+        elapsed = time.perf_counter() - self.started
+        return self.busy_seconds / (elapsed * self.size) if elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        browser_rss = rss_mb(browser_processes())
+        mean_wait = self.wait_seconds / self.navigations if self.navigations else 0.0
+        return (
+            f"\t- page pool: {self.size} pages, {self.utilization:.0%} utilization, "
+            f"{mean_wait:.2f}s mean wait, {self.navigations} navigations, "
+            f"{self.recycles} recycled, {self.failures} failed, {browser_rss:.0f} MB Chromium RSS"
+        )
+
+
+def browser_processes() -> List[psutil.Process]:
+    """Find the Chromium processes started by this process."""
+    processes = []
+    for process in psutil.Process().children(recursive=True):
+        try:
+            if "chrom" in process.name().lower() or "headless_shell" in process.name():
+                processes.append(process)
+        except psutil.NoSuchProcess:
+            pass
+    return processes
+
+
+def cpu_seconds(processes: List[psutil.Process]) -> float:
+    total = 0.0
+    for process in processes:
+        try:
+            times = process.cpu_times()
+            total += times.user + times.system
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def rss_mb(processes: List[psutil.Process]) -> float:
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return total / (1024 * 1024)
@@ -1,25 +1,158 @@
-from __future__ import annotations as _annotations
-
+import asyncio
+import functools
 import os
+import time
 
 from dataclasses import dataclass
-from dotenv import load_dotenv
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.openai import OpenAIModel
-from openai import AsyncOpenAI
-from supabase import Client
-from typing import List
+from embeddings import EmbeddingProvider, get_embedding_provider
+from telemetry import cache_requests, db_seconds, prefetch_saved_seconds, tool_seconds, traced
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from supabase import Client
+
+
+# Heavy packages (Pydantic AI, OpenAI, Supabase) are imported when the agent is
+# built rather than at import time. Tool annotations are evaluated when the
+# tools are defined, so this module must not use `from __future__ import annotations`.
+#
+# The Supabase client is synchronous. Tools run its requests in a thread, so
+# they don't block other conversations served by the same event loop (api.py).
+
+
+@dataclass
+class PrefetchStats:
+    prefetched: int = 0
+    hits: int = 0  # The page was ready when the agent asked for it.
+    in_flight: int = 0  # The page was still being fetched.
+    misses: int = 0
+    errors: int = 0  # The prefetch failed, so the tool fetched the page itself.
+    unused: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.in_flight + self.misses + self.errors
+        return (self.hits + self.in_flight) / lookups if lookups else 0.0
+
+    def add(self, other: "PrefetchStats"):
+        """Add the counts of another run."""
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def report(self) -> str:
+        return (
+            f"\t- prefetch: {self.prefetched} pages prefetched, {self.unused} unused; "
+            f"{self.hits} hits, {self.in_flight} in flight, {self.misses} misses, {self.errors} errors "
+            f"({self.hit_rate:.0%} hit rate), {self.saved_seconds * 1000:.0f} ms saved"
+        )
+
 
-load_dotenv()
+class PageCache:
+    """Pages fetched ahead of `get_page_content`, for one agent run.
 
-llm = os.getenv('LLM_MODEL', 'gpt-4o-mini')
-model = OpenAIModel(llm)
+    The agent usually asks for the page of one of the chunks it retrieved,
+    so retrieval starts fetching the top `pages` pages in the background.
+    Entries expire after `ttl` seconds. Call `close` when the run is over to
+    cancel fetches that are still running.
+    """
+
+    def __init__(self, pages: int = 2, ttl: float = 60.0):
+        self.pages = pages
+        self.ttl = ttl
+        self.stats = PrefetchStats()
+        self._entries: Dict[str, Tuple[float, asyncio.Task]] = {}
+        self._used: Set[str] = set()
+
+    def _expire(self):
+        now = time.monotonic()
+        for url, (started, _) in list(self._entries.items()):
+            if now - started >= self.ttl:
+                self._discard(url)
+
+    def _discard(self, url: str):
+        _, task = self._entries.pop(url)
+        if task.done():
+            if not task.cancelled():
+                task.exception()  # Retrieved, so a failed prefetch is not reported as unhandled.
+        else:
+            task.cancel()
+        if url not in self._used:
+            self.stats.unused += 1
+        self._used.discard(url)
+
+    def prefetch(self, url: str, fetch: Callable[[], Awaitable[str]]):
+        """Start fetching a page, unless it is already cached."""
+        self._expire()
+        if url in self._entries:
+            return
+
+        async def timed_fetch() -> Tuple[str, float]:
+            started = time.perf_counter()
+            content = await fetch()
+            return content, time.perf_counter() - started
+
+        self._entries[url] = (time.monotonic(), asyncio.create_task(timed_fetch()))
+        self.stats.prefetched += 1
+
+    async def get(self, url: str) -> Optional[str]:
+        """The prefetched page, waiting for it if it is still being fetched. None on a miss."""
+        self._expire()
+        entry = self._entries.get(url)
+        if entry is None:
+            self.stats.misses += 1
+            cache_requests.inc(cache='page_prefetch', result='miss')
+            return None
+
+        task = entry[1]
+        ready = task.done()
+        started = time.perf_counter()
+        try:
+            content, fetch_seconds = await asyncio.shield(task)
+        except Exception:
+            # Let the tool fetch the page itself. The page was asked for, so it is not unused.
+            self._used.add(url)
+            self._discard(url)
+            self.stats.errors += 1
+            cache_requests.inc(cache='page_prefetch', result='error')
+            return None
+
+        saved = max(0.0, fetch_seconds - (time.perf_counter() - started))
+        self._used.add(url)
+        self.stats.saved_seconds += saved
+        prefetch_saved_seconds.inc(saved)
+        if ready:
+            self.stats.hits += 1
+            cache_requests.inc(cache='page_prefetch', result='hit')
+        else:
+            self.stats.in_flight += 1
+            cache_requests.inc(cache='page_prefetch', result='in_flight')
+        return content
+
+    def close(self):
+        for url in list(self._entries):
+            self._discard(url)
 
 
 @dataclass
 class PydanticAIDeps:
-    openai_client: AsyncOpenAI
-    supabase_client: Client
+    openai_client: "AsyncOpenAI"
+    supabase_client: "Client"
+    # Defaults to the provider configured with EMBEDDING_PROVIDER. It must
+    # match the provider that was used to crawl the documentation.
+    embedding_provider: Optional[EmbeddingProvider] = None
+    # Pages prefetched by retrieval. Create new deps (or a new cache) for each run.
+    page_cache: Optional[PageCache] = None
+
+    def __post_init__(self):
+        if self.embedding_provider is None:
+            self.embedding_provider = get_embedding_provider(self.openai_client)
+        if self.page_cache is None:
+            self.page_cache = PageCache(
+                pages=int(os.getenv('PREFETCH_PAGES', '2')),
+                ttl=float(os.getenv('PREFETCH_TTL', '60')),
+            )
 
 
 system_prompt = """
@@ -36,142 +169,206 @@ question unless you have already.
 
 When you first look at the documentation, always start with RAG. Then also
 always check the list of available documentation pages and retrieve the content
-of page(s) if it'll help.
+of page(s) if it'll help. Each chunk found with RAG includes the URL of its page.
 
 Always let the user know when you didn't find the answer in the documentation
 or the right URL. Be honest.
 """
 
-pydantic_ai_expert = Agent(
-    model,
-    system_prompt=system_prompt,
-    deps_type=PydanticAIDeps,
-    retries=2
-)
-
 
-async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
+async def get_embedding(text: str, embedding_provider: EmbeddingProvider) -> List[float]:
+    """Get embedding vector from the embedding provider."""
     try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        return await embedding_provider.embed_one(text)
     except Exception as e:
         print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
-
+        return [0] * embedding_provider.dimensions  # Return zero vector on error
 
-@pydantic_ai_expert.tool
-async def retrieve_relevant_documentation(ctx: RunContext[PydanticAIDeps], user_query: str) -> str:
-    """
-    Retrieve relevant documentation chunks based on the query with RAG.
 
-    Args:
-        ctx: The context including the Supabase client and OpenAI client
-        user_query: The user's question or query
+def match_site_pages(
+    supabase_client: "Client",
+    query_embedding: List[float],
+    match_count: int,
+    filter: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """Find the chunks closest to a query embedding.
 
-    Returns:
-        A formatted string containing the top 5 most relevant documentation chunks
+    RETRIEVAL_MODE is "exact" (default), "halfvec" or "binary". The last two
+    search the compact columns from sql/quantize_site_pages.sql for
+    RETRIEVAL_CANDIDATES candidates, then rerank them at full precision.
     """
-    try:
-        # Get the embedding for the query
-        query_embedding = await get_embedding(user_query, ctx.deps.openai_client)
-
-        # Query Supabase for relevant documents
-        result = ctx.deps.supabase_client.rpc(
-            'match_site_pages',
+    mode = os.getenv('RETRIEVAL_MODE', 'exact')
+    if mode == 'exact':
+        function, params = 'match_site_pages', {}
+    elif mode in ('halfvec', 'binary'):
+        function = 'match_site_pages_two_stage'
+        params = {'coarse': mode, 'candidate_count': int(os.getenv('RETRIEVAL_CANDIDATES', '100'))}
+    else:
+        raise ValueError(f"Unknown RETRIEVAL_MODE: {mode}")
+
+    with traced('db match_site_pages', db_seconds, {'operation': function}, mode=mode) as span:
+        result = supabase_client.rpc(
+            function,
             {
                 'query_embedding': query_embedding,
-                'match_count': 5,
-                'filter': {'source': 'pydantic_ai_docs'}
+                'match_count': match_count,
+                'filter': filter,
+                **params,
             }
         ).execute()
-
-        if not result.data:
-            return "No relevant documentation found."
-
-        # Format the results
-        formatted_chunks = []
-        for doc in result.data:
-            chunk_text = f"""
-# {doc['title']}
-
-{doc['content']}
-"""
-            formatted_chunks.append(chunk_text)
-
-        # Join all chunks with a separator
-        return "\n\n---\n\n".join(formatted_chunks)
-
-    except Exception as e:
-        print(f"Error retrieving documentation: {e}")
-        return f"Error retrieving documentation: {str(e)}"
-
-
-@pydantic_ai_expert.tool
-async def list_documentation_pages(ctx: RunContext[PydanticAIDeps]) -> List[str]:
-    """
-    Retrieve a list of all available Pydantic AI documentation pages.
-
-    Returns:
-        List[str]: List of unique URLs for all documentation pages
-    """
-    try:
-        # Query Supabase for unique URLs where source is pydantic_ai_docs
-        result = ctx.deps.supabase_client.from_('site_pages') \
-            .select('url') \
-            .eq('metadata->>source', 'pydantic_ai_docs') \
-            .execute()
-
-        if not result.data:
-            return []
-
-        # Extract unique URLs
-        urls = sorted(set(doc['url'] for doc in result.data))
-        return urls
-
-    except Exception as e:
-        print(f"Error retrieving documentation pages: {e}")
-        return []
+        span.set_attribute('results', len(result.data))
+    return result.data
 
 
-@pydantic_ai_expert.tool
-async def get_page_content(ctx: RunContext[PydanticAIDeps], url: str) -> str:
-    """
-    Retrieve the full content of a specific documentation page by combining all its chunks.
-
-    Args:
-        ctx: The context including the Supabase client
-        url: The URL of the page to retrieve
-
-    Returns:
-        str: The complete page content with all chunks combined in order
-    """
-    try:
+async def fetch_page_content(supabase_client: "Client", url: str) -> str:
+    """The full content of a documentation page, with all its chunks combined in order."""
+    with traced('db page_content', db_seconds, {'operation': 'page_content'}, url=url):
         # Query Supabase for all chunks of this URL, ordered by chunk_number
-        result = ctx.deps.supabase_client.from_('site_pages') \
-            .select('title, content, chunk_number') \
-            .eq('url', url) \
-            .eq('metadata->>source', 'pydantic_ai_docs') \
-            .order('chunk_number') \
-            .execute()
-
-        if not result.data:
-            return f"No content found for URL: {url}"
-
-        # Format the page with its title and all chunks
-        page_title = result.data[0]['title'].split(' - ')[0]  # Get the main title
-        formatted_content = [f"# {page_title}\n"]
+        result = await asyncio.to_thread(
+            supabase_client.from_('site_pages')
+            .select('title, content, chunk_number')
+            .eq('url', url)
+            .eq('metadata->>source', 'pydantic_ai_docs')
+            .order('chunk_number')
+            .execute
+        )
 
-        # Add each chunk's content
-        for chunk in result.data:
-            formatted_content.append(chunk['content'])
+    if not result.data:
+        return f"No content found for URL: {url}"
+
+    # Format the page with its title and all chunks
+    page_title = result.data[0]['title'].split(' - ')[0]  # Get the main title
+    formatted_content = [f"# {page_title}\n"]
+
+    # Add each chunk's content
+    for chunk in result.data:
+        formatted_content.append(chunk['content'])
+
+    # Join everything together
+    return "\n\n".join(formatted_content)
+
+
+@functools.cache
+def get_pydantic_ai_expert():
+    """Create the Pydantic AI expert agent and register its tools."""
+    from pydantic_ai import Agent, RunContext
+    from pydantic_ai.models.openai import OpenAIModel
+
+    llm = os.getenv('LLM_MODEL', 'gpt-4o-mini')
+    model = OpenAIModel(llm)
+
+    pydantic_ai_expert = Agent(
+        model,
+        system_prompt=system_prompt,
+        deps_type=PydanticAIDeps,
+        retries=2
+    )
+
+    @pydantic_ai_expert.tool
+    async def retrieve_relevant_documentation(ctx: RunContext[PydanticAIDeps], user_query: str) -> str:
+        """
+        Retrieve relevant documentation chunks based on the query with RAG.
+
+        Args:
+            ctx: The context including the Supabase client and embedding provider
+            user_query: The user's question or query
+
+        Returns:
+            A formatted string containing the top 5 most relevant documentation chunks
+        """
+        with traced('tool retrieve_relevant_documentation', tool_seconds, {'tool': 'retrieve_relevant_documentation'}, user_query=user_query):
+            try:
+                # Get the embedding for the query
+                query_embedding = await get_embedding(user_query, ctx.deps.embedding_provider)
+
+                # Query Supabase for relevant documents
+                documents = await asyncio.to_thread(
+                    match_site_pages,
+                    ctx.deps.supabase_client,
+                    query_embedding,
+                    match_count=5,
+                    filter={'source': 'pydantic_ai_docs'},
+                )
+
+                if not documents:
+                    return "No relevant documentation found."
+
+                # The agent usually reads one of these pages next. Start fetching them now.
+                page_cache = ctx.deps.page_cache
+                for url in list(dict.fromkeys(doc['url'] for doc in documents))[:page_cache.pages]:
+                    page_cache.prefetch(url, functools.partial(fetch_page_content, ctx.deps.supabase_client, url))
+
+                # Format the results
+                formatted_chunks = []
+                for doc in documents:
+                    chunk_text = f"""
+# {doc['title']}
 
-        # Join everything together
-        return "\n\n".join(formatted_content)
+Source: {doc['url']}
 
-    except Exception as e:
-        print(f"Error retrieving page content: {e}")
-        return f"Error retrieving page content: {str(e)}"
+{doc['content']}
+"""
+                    formatted_chunks.append(chunk_text)
+
+                # Join all chunks with a separator
+                return "\n\n---\n\n".join(formatted_chunks)
+
+            except Exception as e:
+                print(f"Error retrieving documentation: {e}")
+                return f"Error retrieving documentation: {str(e)}"
+
+    @pydantic_ai_expert.tool
+    async def list_documentation_pages(ctx: RunContext[PydanticAIDeps]) -> List[str]:
+        """
+        Retrieve a list of all available Pydantic AI documentation pages.
+
+        Returns:
+            List[str]: List of unique URLs for all documentation pages
+        """
+        with traced('tool list_documentation_pages', tool_seconds, {'tool': 'list_documentation_pages'}):
+            try:
+                # Query Supabase for unique URLs where source is pydantic_ai_docs
+                result = await asyncio.to_thread(
+                    ctx.deps.supabase_client.from_('site_pages')
+                    .select('url')
+                    .eq('metadata->>source', 'pydantic_ai_docs')
+                    .execute
+                )
+
+                if not result.data:
+                    return []
+
+                # Extract unique URLs
+                urls = sorted(set(doc['url'] for doc in result.data))
+                return urls
+
+            except Exception as e:
+                print(f"Error retrieving documentation pages: {e}")
+                return []
+
+    @pydantic_ai_expert.tool
+    async def get_page_content(ctx: RunContext[PydanticAIDeps], url: str) -> str:
+        """
+        Retrieve the full content of a specific documentation page by combining all its chunks.
+
+        Args:
+            ctx: The context including the Supabase client
+            url: The URL of the page to retrieve
+
+        Returns:
+            str: The complete page content with all chunks combined in order
+        """
+        with traced('tool get_page_content', tool_seconds, {'tool': 'get_page_content'}, url=url) as span:
+            try:
+                # Retrieval may have fetched the page already.
+                content = await ctx.deps.page_cache.get(url)
+                span.set_attribute('prefetched', content is not None)
+                if content is None:
+                    content = await fetch_page_content(ctx.deps.supabase_client, url)
+                return content
+
+            except Exception as e:
+                print(f"Error retrieving page content: {e}")
+                return f"Error retrieving page content: {str(e)}"
+
+    return pydantic_ai_expert
@@ -0,0 +1,233 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+
+@dataclass
+class CrawlJob:
+    url: str
+    attempts: int = 0
+
+    @property
+    def host(self) -> str:
+        return urlparse(self.url).netloc
+
+
+@dataclass
+class JobResult:
+    url: str
+    attempts: int
+    seconds: float
+    value: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+class CrawlScheduler:
+    """Run a crawl function over many URLs with a sliding window of workers.
+
+    Each of the `max_concurrent` workers takes the next URL as soon as it
+    finishes the previous one, so a slow page never stalls the others. Workers
+    skip hosts that are at their politeness limit (`per_host_limit` concurrent
+    requests, and at least `per_host_delay` seconds between requests) and take
+    work for another host instead.
+
+    A crawl that raises or takes longer than `timeout` seconds is retried up
+    to `max_retries` times, with exponential backoff. Results are yielded as
+    they complete.
+
+    URLs can come from an async iterator, such as a streaming sitemap reader.
+    At most `max_pending` URLs are read ahead of the workers. URLs waiting to
+    be retried count towards that limit, so reading ahead pauses while many
+    crawls are failing. A retry is never held back, though, so the limit can
+    be passed by up to `max_concurrent` URLs.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 10,
+        per_host_limit: int = 4,
+        per_host_delay: float = 0.0,
+        timeout: Optional[float] = 60.0,
+        max_retries: int = 2,
+        retry_backoff: float = 1.0,
+        max_pending: int = 1000,
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_host_limit = per_host_limit
+        self.per_host_delay = per_host_delay
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_pending = max_pending
+        self._reset()
+
+    def _reset(self):
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.timed_out = 0
+        self.busy_seconds = 0.0
+        self.started = time.perf_counter()
+        self._pending: Dict[str, Deque[CrawlJob]] = {}
+        # Jobs in `_pending` and `_retries`.
+        self._pending_count = 0
+        self._retries: List[Tuple[float, int, CrawlJob]] = []
+        self._sequence = itertools.count()
+        self._host_active: Dict[str, int] = {}
+        self._host_next_start: Dict[str, float] = {}
+        self._active = 0
+        self._feeding = True
+        self._feed_error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self._results: asyncio.Queue = asyncio.Queue()
+
+    async def run(
+        self,
+        urls: Union[Iterable[str], AsyncIterable[str]],
+        crawl: Callable[[str], Awaitable[Any]],
+    ) -> AsyncIterator[JobResult]:
+        """Crawl every URL and yield a result for each, in order of completion."""
+        self._reset()
+        feeder = asyncio.create_task(self._feed(urls))
+        workers = [asyncio.create_task(self._work(crawl)) for _ in range(self.max_concurrent)]
+
+        async def close():
+            await asyncio.gather(*workers)
+            self._results.put_nowait(None)
+
+        closer = asyncio.create_task(close())
+        try:
+            while (result := await self._results.get()) is not None:
+                yield result
+        finally:
+            for task in [feeder, closer, *workers]:
+                task.cancel()
+
+        if self._feed_error is not None:
+            raise self._feed_error
+
+    async def _feed(self, urls: Union[Iterable[str], AsyncIterable[str]]):
+        try:
+            if isinstance(urls, AsyncIterable):
+                async for url in urls:
+                    await self._add(CrawlJob(url=url))
+            else:
+                for url in urls:
+                    await self._add(CrawlJob(url=url))
+        except Exception as e:
+            self._feed_error = e
+        finally:
+            async with self._changed:
+                self._feeding = False
+                self._changed.notify_all()
+
+    async def _add(self, job: CrawlJob):
+        async with self._changed:
+            while self._pending_count >= self.max_pending:
+                await self._changed.wait()
+            self._pending.setdefault(job.host, deque()).append(job)
+            self._pending_count += 1
+            self._changed.notify_all()
+
+    def _next_job(self, now: float) -> Tuple[Optional[CrawlJob], Optional[float]]:
+        """Pick a job whose host is free. Otherwise, say how long to wait for one."""
+        while self._retries and self._retries[0][0] <= now:
+            _, _, job = heapq.heappop(self._retries)
+            self._pending.setdefault(job.host, deque()).append(job)
+
+        wake_at = self._retries[0][0] if self._retries else None
+        for host, jobs in self._pending.items():
+            if not jobs or self._host_active.get(host, 0) >= self.per_host_limit:
+                continue
+            next_start = self._host_next_start.get(host, 0.0)
+            if next_start > now:
+                wake_at = next_start if wake_at is None else min(wake_at, next_start)
+                continue
+
+            job = jobs.popleft()
+            self._pending_count -= 1
+            if not jobs:
+                del self._pending[host]
+            return job, None
+        return None, wake_at
+
+    def _finished(self) -> bool:
+        return not self._feeding and not self._pending and not self._retries and self._active == 0
+
+    async def _work(self, crawl: Callable[[str], Awaitable[Any]]):
+        while True:
+            async with self._changed:
+                while True:
+                    now = time.monotonic()
+                    job, wake_at = self._next_job(now)
+                    if job is not None or self._finished():
+                        break
+                    try:
+                        await asyncio.wait_for(
+                            self._changed.wait(),
+                            timeout=None if wake_at is None else wake_at - now,
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+
+                if job is None:
+                    return
+                self._active += 1
+                self._host_active[job.host] = self._host_active.get(job.host, 0) + 1
+                self._host_next_start[job.host] = now + self.per_host_delay
+                # A pending slot is free for the feeder.
+                self._changed.notify_all()
+
+            job.attempts += 1
+            started = time.perf_counter()
+            value, error = None, None
+            try:
+                value = await asyncio.wait_for(crawl(job.url), timeout=self.timeout)
+            except asyncio.TimeoutError as e:
+                self.timed_out += 1
+                error = e
+            except Exception as e:
+                error = e
+            elapsed = time.perf_counter() - started
+            self.busy_seconds += elapsed
+
+            async with self._changed:
+                self._active -= 1
+                self._host_active[job.host] -= 1
+                if error is not None and job.attempts <= self.max_retries:
+                    self.retried += 1
+                    retry_at = time.monotonic() + self.retry_backoff * 2 ** (job.attempts - 1)
+                    heapq.heappush(self._retries, (retry_at, next(self._sequence), job))
+                    self._pending_count += 1
+                else:
+                    if error is None:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                    self._results.put_nowait(
+                        JobResult(url=job.url, attempts=job.attempts, seconds=elapsed, value=value, error=error)
+                    )
+                self._changed.notify_all()
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of worker time spent crawling since the run started."""
+        elapsed = time.perf_counter() - self.started
+        return self.busy_seconds / (elapsed * self.max_concurrent) if elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        return (
+            f"\t- scheduler: {self.completed} completed, {self.failed} failed, "
+            f"{self.retried} retried, {self.timed_out} timed out, "
+            f"{self.utilization:.0%} worker utilization"
+        )
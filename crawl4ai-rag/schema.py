@@ -0,0 +1,81 @@
+"""Print the `site_pages` schema for a given embedding dimension.
+
+The schema in sql/create_site_pages.sql is written for 1536-dimension
+OpenAI embeddings. Local models produce fewer dimensions, for example 384
+for all-MiniLM-L6-v2:
+
+    python schema.py --dimensions 384 > create_site_pages_384.sql
+
+Then run the printed script in the Supabase SQL Editor. The same works for
+sql/quantize_site_pages.sql, which also takes the size of the truncated
+half-precision column used for two-stage search:
+
+    python schema.py --schema sql/quantize_site_pages.sql --coarse-dimensions 512
+
+Any other script in sql/ that names a vector type, such as
+sql/dedup_site_pages.sql, is rendered the same way.
+"""
+
+import argparse
+import os
+import re
+
+from dotenv import load_dotenv
+
+
+schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "create_site_pages.sql")
+default_dimensions = 1536
+default_coarse_dimensions = 256
+
+
+def render_schema(
+    dimensions: int,
+    path: str = schema_path,
+    coarse_dimensions: int = default_coarse_dimensions,
+) -> str:
+    """Read a schema script and change the dimension of every vector type in it.
+
+    Raises ValueError if the script has a truncated column and
+    `coarse_dimensions` is more than `dimensions`.
+    """
+    with open(path) as f:
+        sql = f.read()
+    # The truncated column in quantize_site_pages.sql keeps the first
+    # `coarse_dimensions` values of each embedding. That prefix is only a good
+    # embedding for Matryoshka-trained models such as text-embedding-3. It is
+    # not valid for the local or Ollama models: use the binary column for them.
+    truncated = re.search(rf"\bsubvector\(.+?, 1, {default_coarse_dimensions}\)", sql) is not None
+    if truncated and coarse_dimensions > dimensions:
+        raise ValueError(
+            f"The truncated column can't have more dimensions ({coarse_dimensions}) than the embeddings ({dimensions})."
+        )
+    sql = re.sub(rf"\b(vector|halfvec|bit)\({default_dimensions}\)", rf"\g<1>({dimensions})", sql)
+    sql = re.sub(rf"\bhalfvec\({default_coarse_dimensions}\)", f"halfvec({coarse_dimensions})", sql)
+    return re.sub(rf"\bsubvector\((.+?), 1, {default_coarse_dimensions}\)", rf"subvector(\g<1>, 1, {coarse_dimensions})", sql)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Print the site_pages schema for a given embedding dimension.")
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        default=int(os.getenv("EMBEDDING_DIMENSIONS", str(default_dimensions))),
+        help="Embedding dimensions. Defaults to EMBEDDING_DIMENSIONS.",
+    )
+    parser.add_argument(
+        "--coarse-dimensions",
+        type=int,
+        default=int(os.getenv("EMBEDDING_COARSE_DIMENSIONS", str(default_coarse_dimensions))),
+        help="Dimensions of the truncated column used for two-stage search. Defaults to EMBEDDING_COARSE_DIMENSIONS.",
+    )
+    parser.add_argument("--schema", default=schema_path, help="Schema script to render.")
+    args = parser.parse_args()
+    try:
+        print(render_schema(args.dimensions, args.schema, args.coarse_dimensions))
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
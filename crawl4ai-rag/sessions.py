@@ -0,0 +1,158 @@
+"""Conversation history storage for the API.
+
+Conversations are lists of Pydantic AI messages, serialized with
+`ModelMessagesTypeAdapter`. SESSION_STORE chooses where they are kept:
+
+    memory    in this process, expiring after SESSION_TTL seconds (default).
+              Only for a single API process.
+    supabase  in the `conversations` table (sql/create_conversations.sql),
+              shared by every API process.
+
+Each stored conversation has a version. `save` only succeeds if the
+conversation is still at the version it was read at, so when two processes
+run a turn on the same conversation at once, the second save fails with
+`ConversationChanged` instead of overwriting the first turn.
+"""
+
+import asyncio
+import os
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from pydantic_ai.messages import ModelMessage
+    from supabase import Client
+
+
+@dataclass
+class Conversation:
+    messages: List["ModelMessage"] = field(default_factory=list)
+    # 0 for a conversation that has not been stored yet.
+    version: int = 0
+
+
+class ConversationChanged(Exception):
+    """The conversation was saved by another turn since it was read."""
+
+
+class SessionStore:
+    async def get(self, key: str) -> Conversation:
+        """The conversation, or an empty one for a new conversation."""
+        raise NotImplementedError
+
+    async def save(self, key: str, messages: List["ModelMessage"], version: int):
+        """Store the messages, if the conversation is still at `version`. Raises `ConversationChanged`."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Conversations in a dict, least recently used first.
+
+    Messages are stored as JSON, so callers never share message objects.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_sessions: int = 10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, int, bytes]]" = OrderedDict()
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            key, (updated, _, _) = next(iter(self._sessions.items()))
+            if now - updated < self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[key]
+
+    async def get(self, key: str) -> Conversation:
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        self._expire()
+        entry = self._sessions.get(key)
+        if entry is None:
+            return Conversation()
+        return Conversation(ModelMessagesTypeAdapter.validate_json(entry[2]), entry[1])
+
+    async def save(self, key: str, messages: List["ModelMessage"], version: int):
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        entry = self._sessions.get(key)
+        if (entry[1] if entry else 0) != version:
+            raise ConversationChanged(key)
+        self._sessions[key] = (time.monotonic(), version + 1, ModelMessagesTypeAdapter.dump_json(messages))
+        self._sessions.move_to_end(key)
+        self._expire()
+
+    async def delete(self, key: str):
+        self._sessions.pop(key, None)
+
+
+class SupabaseSessionStore(SessionStore):
+    """Conversations in a Supabase table, one row per conversation.
+
+    The Supabase client is synchronous, so requests run in a thread.
+    """
+
+    def __init__(self, supabase_client: "Client", table: str = "conversations"):
+        self.supabase_client = supabase_client
+        self.table = table
+
+    async def get(self, key: str) -> Conversation:
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        result = await asyncio.to_thread(
+            lambda: self.supabase_client.table(self.table).select("messages, version").eq("id", key).execute()
+        )
+        if not result.data:
+            return Conversation()
+        row = result.data[0]
+        return Conversation(ModelMessagesTypeAdapter.validate_python(row["messages"]), row["version"])
+
+    async def save(self, key: str, messages: List["ModelMessage"], version: int):
+        from postgrest.exceptions import APIError
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        row = {
+            "messages": ModelMessagesTypeAdapter.dump_python(messages, mode="json"),
+            "version": version + 1,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        table = self.supabase_client.table(self.table)
+        if version == 0:
+            # A new conversation. If another turn created it first, the insert fails.
+            try:
+                await asyncio.to_thread(lambda: table.insert({"id": key, **row}).execute())
+            except APIError as e:
+                if e.code == "23505":  # unique_violation
+                    raise ConversationChanged(key) from e
+                raise
+            return
+
+        # Compare and set: only update the row if nobody saved it since it was read.
+        result = await asyncio.to_thread(
+            lambda: table.update(row).eq("id", key).eq("version", version).execute()
+        )
+        if not result.data:
+            raise ConversationChanged(key)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(lambda: self.supabase_client.table(self.table).delete().eq("id", key).execute())
+
+
+def get_session_store(supabase_client: Optional["Client"] = None) -> SessionStore:
+    """Get the session store configured with SESSION_STORE."""
+    store = os.getenv("SESSION_STORE", "memory")
+    if store == "memory":
+        return MemorySessionStore(ttl=float(os.getenv("SESSION_TTL", "3600")))
+    if store == "supabase":
+        if supabase_client is None:
+            raise ValueError("The supabase session store needs a Supabase client.")
+        return SupabaseSessionStore(supabase_client)
+    raise ValueError(f"Unknown SESSION_STORE: {store}")
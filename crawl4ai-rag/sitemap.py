@@ -0,0 +1,143 @@
+import asyncio
+import httpx
+import re
+import zlib
+
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Optional, Set, Tuple
+from xml.etree import ElementTree
+
+
+gzip_magic = b"\x1f\x8b"
+
+
+@dataclass
+class SitemapEntry:
+    loc: str
+    lastmod: Optional[str] = None
+    priority: Optional[float] = None
+
+
+def local_name(tag: str) -> str:
+    """Strip the XML namespace from a tag, e.g. "{http://...}loc" -> "loc"."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def matches(url: str, include: Iterable[re.Pattern], exclude: Iterable[re.Pattern]) -> bool:
+    include = list(include)
+    if include and not any(pattern.search(url) for pattern in include):
+        return False
+    return not any(pattern.search(url) for pattern in exclude)
+
+
+async def parse_sitemap(client: httpx.AsyncClient, url: str) -> AsyncIterator[Tuple[str, SitemapEntry]]:
+    """Stream one sitemap and yield ("url", entry) or ("sitemap", entry) pairs.
+
+    The response is parsed incrementally as it downloads, and gzipped
+    sitemaps are decompressed on the fly. Parsed elements are discarded right
+    away, so memory use doesn't grow with the size of the sitemap.
+    """
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    decompressor = None
+    first_chunk = True
+    root = None
+
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            # .xml.gz files are usually served as gzip content, not gzip-encoded.
+            if first_chunk:
+                first_chunk = False
+                if chunk.startswith(gzip_magic):
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            parser.feed(chunk)
+
+            for event, element in parser.read_events():
+                if event == "start":
+                    if root is None:
+                        root = element
+                    continue
+
+                kind = local_name(element.tag)
+                if kind not in ("url", "sitemap"):
+                    continue
+
+                fields = {local_name(child.tag): (child.text or "").strip() for child in element}
+                root.clear()
+                if not fields.get("loc"):
+                    continue
+
+                priority = fields.get("priority")
+                yield kind, SitemapEntry(
+                    loc=fields["loc"],
+                    lastmod=fields.get("lastmod") or None,
+                    priority=float(priority) if priority else None,
+                )
+
+    parser.close()
+
+
+async def iter_sitemap(
+    url: str,
+    include: Iterable[str] = (),
+    exclude: Iterable[str] = (),
+    max_concurrent: int = 4,
+    client: Optional[httpx.AsyncClient] = None,
+) -> AsyncIterator[SitemapEntry]:
+    """Yield every page in a sitemap, following sitemap indexes.
+
+    Child sitemaps of a sitemap index are read concurrently. Only URLs that
+    match at least one `include` pattern (if any are given) and no `exclude`
+    pattern are yielded. Patterns are regular expressions.
+    """
+    include_patterns = [re.compile(pattern) for pattern in include]
+    exclude_patterns = [re.compile(pattern) for pattern in exclude]
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(30.0))
+
+    # A bounded queue applies backpressure, so readers never get far ahead of the crawl.
+    entries: asyncio.Queue = asyncio.Queue(maxsize=1000)
+    semaphore = asyncio.Semaphore(max_concurrent)
+    seen: Set[str] = set()
+    tasks: Set[asyncio.Task] = set()
+    done = object()
+    pending = 0
+
+    async def read(sitemap_url: str):
+        nonlocal pending
+        try:
+            async with semaphore:
+                async for kind, entry in parse_sitemap(client, sitemap_url):
+                    if kind == "sitemap":
+                        start(entry.loc)
+                    elif matches(entry.loc, include_patterns, exclude_patterns):
+                        await entries.put(entry)
+        except Exception as e:
+            print(f"Error reading sitemap {sitemap_url}: {e}")
+        finally:
+            pending -= 1
+            if pending == 0:
+                await entries.put(done)
+
+    def start(sitemap_url: str):
+        nonlocal pending
+        if sitemap_url in seen:
+            return
+        seen.add(sitemap_url)
+        pending += 1
+        task = asyncio.create_task(read(sitemap_url))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    start(url)
+    try:
+        while (entry := await entries.get()) is not done:
+            yield entry
+    finally:
+        for task in list(tasks):
+            task.cancel()
+        if own_client:
+            await client.aclose()
@@ -0,0 +1,24 @@
+-- Conversation history for the API (api.py) with SESSION_STORE="supabase".
+-- Each row is one conversation: its id is "<tenant>/<conversation id>" and
+-- its messages are Pydantic AI messages serialized as JSON.
+
+create table conversations (
+    id varchar primary key,
+    messages jsonb not null default '[]'::jsonb,
+    -- Incremented on every save. The API only saves a turn if the version is
+    -- unchanged since it read the conversation, so concurrent turns on
+    -- different processes can't overwrite each other.
+    version integer not null default 1,
+    created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+-- For removing old conversations, for example:
+-- delete from conversations where updated_at < now() - interval '7 days';
+create index idx_conversations_updated_at on conversations (updated_at);
+
+-- Everything above will work for any PostgreSQL database. The below commands are for Supabase security
+
+-- Enable RLS on the table. There are no policies: only the service key
+-- (which the API uses) can read or write conversations.
+alter table conversations enable row level security;
@@ -10,7 +10,7 @@ create table site_pages (
     summary varchar not null,
     content text not null,  -- Added content column
     metadata jsonb not null default '{}'::jsonb,  -- Added metadata column
-    embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions
+    embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions. Use schema.py for other sizes.
     created_at timestamp with time zone default timezone('utc'::text, now()) not null,
     
     -- Add a unique constraint to prevent duplicate chunks for the same URL
@@ -54,6 +54,7 @@ begin
     1 - (site_pages.embedding <=> query_embedding) as similarity
   from site_pages
   where metadata @> filter
+    and site_pages.embedding is not null  -- Duplicate chunks have no embedding
   order by site_pages.embedding <=> query_embedding
   limit match_count;
 end;
@@ -0,0 +1,45 @@
+-- Duplicate chunks are stored without an embedding and with a reference to
+-- their canonical chunk in metadata->'duplicate_of'. Run this on databases
+-- created before deduplication, so searches skip the duplicates.
+-- (create_site_pages.sql already includes it.)
+--
+-- Written for 1536-dimension embeddings. For other sizes, render it with
+-- schema.py, the same as create_site_pages.sql:
+--
+--     python schema.py --schema sql/dedup_site_pages.sql --dimensions 384
+
+create or replace function match_site_pages (
+  query_embedding vector(1536),
+  match_count int default 10,
+  filter jsonb DEFAULT '{}'::jsonb
+) returns table (
+  id bigint,
+  url varchar,
+  chunk_number integer,
+  title varchar,
+  summary varchar,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+  return query
+  select
+    id,
+    url,
+    chunk_number,
+    title,
+    summary,
+    content,
+    metadata,
+    1 - (site_pages.embedding <=> query_embedding) as similarity
+  from site_pages
+  where metadata @> filter
+    and site_pages.embedding is not null  -- Duplicate chunks have no embedding
+  order by site_pages.embedding <=> query_embedding
+  limit match_count;
+end;
+$$;
@@ -0,0 +1,122 @@
+-- Compact copies of the embedding for a fast first-stage search.
+-- Requires pgvector 0.7 or later. Run this after create_site_pages.sql.
+--
+-- embedding_half:   the first dimensions (256 by default, see schema.py), renormalized,
+--                   as half-precision floats.
+--                   text-embedding-3 models are trained so that a prefix of the
+--                   vector is itself a good embedding (Matryoshka representation).
+-- embedding_binary: one bit per dimension (the sign of each value).
+--
+-- Search is two-stage: find candidates with a compact column, then rerank
+-- the candidates with the full-precision embedding.
+
+alter table site_pages add column if not exists embedding_half halfvec(256);
+alter table site_pages add column if not exists embedding_binary bit(1536);
+
+-- Keep the compact columns in sync with the embedding.
+create or replace function site_pages_quantize_embedding() returns trigger
+language plpgsql
+as $$
+begin
+  if new.embedding is null then
+    new.embedding_half := null;
+    new.embedding_binary := null;
+  else
+    new.embedding_half := l2_normalize(subvector(new.embedding, 1, 256))::halfvec(256);
+    new.embedding_binary := binary_quantize(new.embedding)::bit(1536);
+  end if;
+  return new;
+end;
+$$;
+
+drop trigger if exists site_pages_quantize_embedding on site_pages;
+create trigger site_pages_quantize_embedding
+  before insert or update of embedding on site_pages
+  for each row execute function site_pages_quantize_embedding();
+
+-- Fill in the compact columns for existing rows.
+update site_pages set embedding = embedding where embedding is not null;
+
+-- Index the compact columns.
+create index if not exists site_pages_embedding_half_idx
+  on site_pages using hnsw (embedding_half halfvec_cosine_ops);
+create index if not exists site_pages_embedding_binary_idx
+  on site_pages using hnsw (embedding_binary bit_hamming_ops);
+
+-- The full-precision index is no longer needed for two-stage search.
+-- Drop it to save memory if you don't use match_site_pages anymore.
+-- drop index if exists site_pages_embedding_idx;
+
+-- Two-stage search. `coarse` is 'halfvec' or 'binary'.
+create or replace function match_site_pages_two_stage (
+  query_embedding vector(1536),
+  match_count int default 10,
+  filter jsonb default '{}'::jsonb,
+  candidate_count int default 100,
+  coarse text default 'halfvec'
+) returns table (
+  id bigint,
+  url varchar,
+  chunk_number integer,
+  title varchar,
+  summary varchar,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+  -- An HNSW index scan returns at most hnsw.ef_search rows (40 by default),
+  -- so raise it for this transaction to get candidate_count candidates
+  -- (up to 1000, the largest value pgvector allows).
+  perform set_config('hnsw.ef_search', least(greatest(candidate_count, 40), 1000)::text, true);
+
+  if coarse = 'binary' then
+    return query
+    with candidates as (
+      select *
+      from site_pages
+      where metadata @> filter
+        and site_pages.embedding is not null
+      order by site_pages.embedding_binary <~> binary_quantize(query_embedding)::bit(1536)
+      limit candidate_count
+    )
+    select
+      id,
+      url,
+      chunk_number,
+      title,
+      summary,
+      content,
+      metadata,
+      1 - (candidates.embedding <=> query_embedding) as similarity
+    from candidates
+    order by candidates.embedding <=> query_embedding
+    limit match_count;
+  else
+    return query
+    with candidates as (
+      select *
+      from site_pages
+      where metadata @> filter
+        and site_pages.embedding is not null
+      order by site_pages.embedding_half <=> l2_normalize(subvector(query_embedding, 1, 256))::halfvec(256)
+      limit candidate_count
+    )
+    select
+      id,
+      url,
+      chunk_number,
+      title,
+      summary,
+      content,
+      metadata,
+      1 - (candidates.embedding <=> query_embedding) as similarity
+    from candidates
+    order by candidates.embedding <=> query_embedding
+    limit match_count;
+  end if;
+end;
+$$;
@@ -12,13 +12,15 @@ from pydantic_ai.messages import (
     UserPromptPart,
     TextPart,
 )
-from pydantic_ai_expert import pydantic_ai_expert, PydanticAIDeps
+from pydantic_ai_expert import get_pydantic_ai_expert, PydanticAIDeps
 from supabase import Client
+from telemetry import configure_telemetry
 from typing import Literal, TypedDict
 
 
 # Load environment variables
 load_dotenv()
+configure_telemetry("crawl4ai-rag-streamlit")
 
 openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 supabase_client: Client = Client(
@@ -65,32 +67,36 @@ async def run_agent_with_streaming(user_input: str):
         supabase_client=supabase_client,
     )
 
-    # Run the agent in a stream
-    async with pydantic_ai_expert.run_stream(
-        user_input,
-        deps=deps,
-        message_history= st.session_state.messages[:-1],  # pass entire conversation so far
-    ) as result:
-        # We'll gather partial text to show incrementally
-        partial_text = ""
-        message_placeholder = st.empty()
-
-        # Render partial text as it arrives
-        async for chunk in result.stream_text(delta=True):
-            partial_text += chunk
-            message_placeholder.markdown(partial_text)
-
-        # Now that the stream is finished, we have a final result.
-        # Add new messages from this run, excluding user-prompt messages
-        filtered_messages = [msg for msg in result.new_messages()
-                            if not (hasattr(msg, 'parts') and
-                                    any(part.part_kind == 'user-prompt' for part in msg.parts))]
-        st.session_state.messages.extend(filtered_messages)
-
-        # Add the final response to the messages
-        st.session_state.messages.append(
-            ModelResponse(parts=[TextPart(content=partial_text)])
-        )
+    try:
+        # Run the agent in a stream
+        async with get_pydantic_ai_expert().run_stream(
+            user_input,
+            deps=deps,
+            message_history= st.session_state.messages[:-1],  # pass entire conversation so far
+        ) as result:
+            # We'll gather partial text to show incrementally
+            partial_text = ""
+            message_placeholder = st.empty()
+
+            # Render partial text as it arrives
+            async for chunk in result.stream_text(delta=True):
+                partial_text += chunk
+                message_placeholder.markdown(partial_text)
+
+            # Now that the stream is finished, we have a final result.
+            # Add new messages from this run, excluding user-prompt messages
+            filtered_messages = [msg for msg in result.new_messages()
+                                if not (hasattr(msg, 'parts') and
+                                        any(part.part_kind == 'user-prompt' for part in msg.parts))]
+            st.session_state.messages.extend(filtered_messages)
+
+            # Add the final response to the messages
+            st.session_state.messages.append(
+                ModelResponse(parts=[TextPart(content=partial_text)])
+            )
+    finally:
+        # Cancel page prefetches the agent didn't use.
+        deps.page_cache.close()
 
 
 async def main():
@@ -0,0 +1,291 @@
+"""Tracing and metrics for the crawler, the tools and the agent.
+
+Tracing uses logfire (OpenTelemetry). Metrics are Prometheus-style counters
+and histograms kept in this process and rendered in the Prometheus text
+format. Both are off by default, and when they are off `traced` returns a
+shared do-nothing object, so instrumented code pays for one function call.
+
+TELEMETRY chooses where spans go:
+
+    off       nothing is recorded (default)
+    console   spans are printed by logfire
+    otlp      spans are sent to an OTLP collector at OTEL_EXPORTER_OTLP_ENDPOINT
+              (default http://localhost:4318)
+    file      spans are appended to TELEMETRY_FILE as JSON lines
+    logfire   spans are sent to Logfire (needs LOGFIRE_TOKEN)
+
+Pydantic AI reports its own agent run and model request spans, with token
+usage, to the same place.
+
+Metrics are served at http://localhost:METRICS_PORT/metrics if METRICS_PORT
+is set, and written to METRICS_FILE by `write_metrics`.
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+_enabled = False
+_logfire = None
+
+
+class Counter:
+    """A value that only goes up, per combination of label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any):
+        if not _enabled:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [
+                (self.name, dict(zip(self.labelnames, key)), value)
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Histogram:
+    """Counts of observations in cumulative buckets, per combination of label values."""
+
+    type = "histogram"
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = default_buckets,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: a count per bucket (plus +Inf), the sum and the count.
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any):
+        if not _enabled:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts[0][index] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, (buckets, total, count) in sorted(self._values.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), buckets):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    samples.append((f"{self.name}_bucket", {**labels, "le": le}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, help, labelnames, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    pairs = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                    name = f"{name}{{{pairs}}}"
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+fetch_seconds = registry.histogram("crawl_fetch_seconds", "Time to fetch a page.", ["tier"])
+fetches = registry.counter("crawl_fetches_total", "Pages fetched.", ["tier", "outcome"])
+llm_seconds = registry.histogram("llm_request_seconds", "Time for an LLM request.", ["operation"])
+llm_tokens = registry.counter("llm_tokens_total", "LLM tokens used.", ["operation", "kind"])
+embedding_seconds = registry.histogram("embedding_batch_seconds", "Time to embed a batch.", ["provider"])
+embedding_texts = registry.counter("embedding_texts_total", "Texts embedded.", ["provider"])
+db_seconds = registry.histogram("db_request_seconds", "Time for a database request.", ["operation"])
+tool_seconds = registry.histogram("tool_call_seconds", "Time for an agent tool call.", ["tool"])
+errors = registry.counter("errors_total", "Failed operations.", ["operation"])
+retries = registry.counter("retries_total", "Retried operations.", ["operation"])
+cache_requests = registry.counter("cache_requests_total", "Cache lookups.", ["cache", "result"])
+prefetch_saved_seconds = registry.counter("prefetch_saved_seconds_total", "Tool time saved by prefetching pages.")
+api_turn_seconds = registry.histogram("api_turn_seconds", "Time to stream an agent turn.", ["outcome"])
+api_queue_seconds = registry.histogram("api_queue_seconds", "Time an API request waited for a slot.")
+api_rejections = registry.counter("api_rejections_total", "API requests turned away.", ["reason"])
+
+
+class _NoopTraced:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_noop = _NoopTraced()
+
+
+class Traced:
+    """A span plus a duration observation in a histogram."""
+
+    def __init__(self, name: str, histogram: Optional[Histogram], labels: Dict[str, Any], attributes: Dict[str, Any]):
+        self.name = name
+        self.histogram = histogram
+        self.labels = labels
+        # Labels win over attributes of the same name.
+        self._span = _logfire.span(name, **{**attributes, **labels})
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._span.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - self._started, **self.labels)
+        if exc_type is not None:
+            errors.inc(operation=self.name)
+        return self._span.__exit__(exc_type, exc, tb)
+
+    def set_attribute(self, key: str, value: Any):
+        self._span.set_attribute(key, value)
+
+
+def traced(name: str, histogram: Optional[Histogram] = None, labels: Optional[Dict[str, Any]] = None, **attributes: Any):
+    """Trace a block of code, and time it in `histogram`.
+
+    `labels` are the histogram's label values; they are also span
+    attributes. Use `set_attribute` on the result to add attributes that are
+    only known at the end, such as token usage.
+    """
+    if not _enabled:
+        return _noop
+    return Traced(name, histogram, labels or {}, attributes)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+@functools.cache
+def configure_telemetry(service_name: str = "crawl4ai-rag") -> bool:
+    """Set up tracing and metrics from the environment. Returns True if enabled."""
+    global _enabled, _logfire
+
+    mode = os.getenv("TELEMETRY", "off")
+    if mode == "off":
+        return False
+
+    import logfire
+
+    if mode == "console":
+        logfire.configure(service_name=service_name, send_to_logfire=False)
+    elif mode == "otlp":
+        # logfire exports to the collector in OTEL_EXPORTER_OTLP_ENDPOINT.
+        os.environ.setdefault("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+        logfire.configure(service_name=service_name, send_to_logfire=False, console=False)
+    elif mode == "file":
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        out = open(os.getenv("TELEMETRY_FILE", "telemetry.jsonl"), "a")
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+        logfire.configure(
+            service_name=service_name,
+            send_to_logfire=False,
+            console=False,
+            additional_span_processors=[BatchSpanProcessor(exporter)],
+        )
+    elif mode == "logfire":
+        logfire.configure(service_name=service_name, send_to_logfire=True)
+    else:
+        raise ValueError(f"Unknown TELEMETRY: {mode}")
+
+    _logfire = logfire
+    _enabled = True
+
+    port = os.getenv("METRICS_PORT")
+    if port:
+        start_metrics_server(int(port))
+    return True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics for Prometheus from a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def write_metrics(path: Optional[str] = None):
+    """Write the metrics to METRICS_FILE (or `path`), if telemetry is on."""
+    path = path or os.getenv("METRICS_FILE")
+    if _enabled and path:
+        with open(path, "w") as f:
+            f.write(registry.render())
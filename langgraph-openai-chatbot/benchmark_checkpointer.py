@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from checkpointer import SqliteCheckpointer
+from langchain_core.messages import AIMessage
+from langgraph.graph import StateGraph
+from langgraph.graph.message import add_messages
+from typing import Annotated
+from typing_extensions import TypedDict
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def echo(state: State):
+    return {"messages": [AIMessage(content=f"Echo: {state['messages'][-1].content}")]}
+
+
+def build_graph(checkpointer: SqliteCheckpointer):
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("echo", echo)
+    graph_builder.set_entry_point("echo")
+    return graph_builder.compile(checkpointer=checkpointer)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory and resume time of the SQLite checkpointer.")
+    parser.add_argument("--turns", type=int, default=5000, help="Total number of turns.")
+    parser.add_argument("--threads", type=int, default=500, help="Number of conversation threads.")
+    parser.add_argument("--report-every", type=int, default=500)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite")
+    checkpointer = SqliteCheckpointer(path)
+    graph = build_graph(checkpointer)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for turn in range(1, args.turns + 1):
+        config = {"configurable": {"thread_id": f"thread-{turn % args.threads}"}}
+        await graph.ainvoke({"messages": [{"role": "user", "content": f"turn {turn}"}]}, config)
+        if turn % args.report_every == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            print(
+                f"turn {turn:>6}: {current / 1024:>8.0f} KiB traced, "
+                f"{os.path.getsize(path) / 1024:>8.0f} KiB on disk, "
+                f"{turn / (time.perf_counter() - start):>6.0f} turns/s"
+            )
+    checkpointer.close()
+
+    # Simulate a restart and time how long it takes to resume a conversation.
+    start = time.perf_counter()
+    checkpointer = SqliteCheckpointer(path)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    checkpoint_tuple = checkpointer.get_tuple(config)
+    elapsed = time.perf_counter() - start
+    messages = len(checkpoint_tuple.checkpoint["channel_values"]["messages"])
+    print(f"\nResumed thread-1 with {messages} messages in {elapsed * 1000:.1f} ms")
+    checkpointer.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
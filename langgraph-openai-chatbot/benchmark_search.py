@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langgraph.prebuilt import ToolNode
+from search import SearchCache, StubSearchBackend, create_search_tool
+from uuid import uuid4
+
+
+def tool_call_message(queries) -> AIMessage:
+    """Build an AI message that calls the search tool once per query."""
+    return AIMessage(
+        content="",
+        tool_calls=[
+            {"name": "web_search", "args": {"query": query}, "id": str(uuid4())}
+            for query in queries
+        ],
+    )
+
+
+async def timed_tool_node(tool_node: ToolNode, queries) -> float:
+    start = time.perf_counter()
+    await tool_node.ainvoke({"messages": [tool_call_message(queries)]})
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot search tool against a stub backend.")
+    parser.add_argument("--tool-calls", type=int, default=4, help="Tool calls per AI message.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub backend latency in seconds.")
+    args = parser.parse_args()
+
+    backend = StubSearchBackend(latency_seconds=args.latency)
+    cache = SearchCache()
+    tool_node = ToolNode(tools=[create_search_tool(backend, cache)])
+    queries = [f"benchmark query {i}" for i in range(args.tool_calls)]
+
+    cold = await timed_tool_node(tool_node, queries)
+    # Same queries with different casing and spacing should be served from the cache.
+    warm = await timed_tool_node(tool_node, [f"  BENCHMARK   query {i}" for i in range(args.tool_calls)])
+
+    print(f"Tool calls per message: {args.tool_calls}")
+    print(f"Sequential estimate:    {args.tool_calls * args.latency:.3f}s")
+    print(f"Concurrent (cold):      {cold:.3f}s")
+    print(f"Concurrent (cached):    {warm:.3f}s")
+    print(f"Backend calls:          {backend.calls}")
+    print(f"Cache hits/misses:      {cache.hits}/{cache.misses}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,83 +1,176 @@
+import argparse
+import asyncio
 import os
+import time
 
-from dotenv import load_dotenv
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import StateGraph
-from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_openai import ChatOpenAI
-from typing import Annotated
-from typing_extensions import TypedDict
 from uuid import uuid4
 
 
-load_dotenv()
+# Heavy packages (LangChain, LangGraph, OpenAI) are imported when the graph is
+# built rather than at import time, so the CLI starts quickly.
 
 
-class State(TypedDict):
-    messages: Annotated[list, add_messages]
+def build_graph(checkpointer):
+    """Build the chatbot graph, its LLM, and its search tool."""
+    from history import elide_answered_tool_results, format_for_summary, split_window, summary_prompt
+    from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage
+    from langchain_openai import ChatOpenAI
+    from langgraph.graph import StateGraph
+    from langgraph.graph.message import add_messages
+    from langgraph.prebuilt import ToolNode, tools_condition
+    from search import SearchCache, StubSearchBackend, TavilySearchBackend, create_search_tool
+    from typing import Annotated
+    from typing_extensions import TypedDict
 
+    class State(TypedDict):
+        messages: Annotated[list, add_messages]
+        summary: str
 
-graph_builder = StateGraph(State)
+    graph_builder = StateGraph(State)
 
-# Define a search tool. The LLM can use this to query the web.
-search_results = TavilySearchResults(
-    max_results=int(os.getenv("TAVILY_MAX_RESULTS", "2")),
-)
+    # Define a search tool. The LLM can use this to query the web.
+    # Set SEARCH_BACKEND=stub to use a local backend for benchmarking.
+    max_results = int(os.getenv("TAVILY_MAX_RESULTS", "2"))
+    if os.getenv("SEARCH_BACKEND", "tavily") == "stub":
+        search_backend = StubSearchBackend(max_results=max_results)
+    else:
+        search_backend = TavilySearchBackend(max_results=max_results)
 
-# Define the LLM.
-llm = ChatOpenAI(
-    model=os.getenv("LLM_MODEL"),
-)
-
-# Attach tools to the LLM.
-llm_with_tools = llm.bind_tools([search_results])
-
-
-def chatbot(state: State):
-    return {"messages": [llm_with_tools.invoke(state["messages"])]}
-
-
-graph_builder.add_node("chatbot", chatbot)
-
-tool_node = ToolNode(tools=[search_results])
-graph_builder.add_node("tools", tool_node)
-
-graph_builder.add_conditional_edges("chatbot", tools_condition)
-graph_builder.add_edge("tools", "chatbot")
-graph_builder.set_entry_point("chatbot")
-
-memory = MemorySaver()
-graph = graph_builder.compile(checkpointer=memory)
-
-memory_config = {"configurable": {"thread_id": str(uuid4())}}
+    search_cache = SearchCache(ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "300")))
+    search_results = create_search_tool(search_backend, search_cache)
 
+    # Define the LLM.
+    llm = ChatOpenAI(
+        model=os.getenv("LLM_MODEL"),
+        stream_usage=True,
+    )
 
-def stream_graph_updates(user_input: str):
-    events = graph.stream(
+    # Attach tools to the LLM.
+    llm_with_tools = llm.bind_tools([search_results])
+
+    # Older turns are folded into a running summary once the history is larger than this.
+    history_max_tokens = int(os.getenv("HISTORY_MAX_TOKENS", "2000"))
+
+    async def trim_history(state: State):
+        """Keep a token-bounded window of messages and summarize the rest."""
+        messages = state["messages"]
+        replacements = {message.id: message for message in elide_answered_tool_results(messages)}
+        messages = [replacements.get(message.id, message) for message in messages]
+
+        older, recent = split_window(messages, history_max_tokens)
+        if not older:
+            return {"messages": list(replacements.values())}
+
+        prompt = summary_prompt.format(
+            summary=state.get("summary") or "(none)",
+            messages=format_for_summary(older),
+        )
+        response = await llm.ainvoke([HumanMessage(content=prompt)])
+        removed_ids = {message.id for message in older}
+        return {
+            "summary": response.content,
+            "messages": [RemoveMessage(id=message_id) for message_id in removed_ids]
+            + [message for message in replacements.values() if message.id not in removed_ids],
+        }
+
+    async def chatbot(state: State):
+        messages = state["messages"]
+        if state.get("summary"):
+            messages = [SystemMessage(content=f"Summary of the conversation so far:\n{state['summary']}")] + messages
+        return {"messages": [await llm_with_tools.ainvoke(messages)]}
+
+    graph_builder.add_node("trim_history", trim_history)
+    graph_builder.add_node("chatbot", chatbot)
+
+    # When run asynchronously, the tool node runs all tool calls from a single AI
+    # message concurrently.
+    tool_node = ToolNode(tools=[search_results])
+    graph_builder.add_node("tools", tool_node)
+
+    graph_builder.add_conditional_edges("chatbot", tools_condition)
+    graph_builder.add_edge("tools", "chatbot")
+    graph_builder.add_edge("trim_history", "chatbot")
+    graph_builder.set_entry_point("trim_history")
+
+    return graph_builder.compile(checkpointer=checkpointer)
+
+
+async def stream_graph_updates(graph, memory_config, user_input: str):
+    """Print LLM tokens as they arrive and report latency for the turn."""
+    from langchain_core.messages import AIMessageChunk, ToolMessage
+
+    start = time.perf_counter()
+    first_token_at = None
+    printing_tokens = False
+    prompt_tokens = []
+
+    events = graph.astream(
         input={"messages":  [{"role": "user", "content": user_input}]},
         config=memory_config,
-        stream_mode="values",
+        stream_mode="messages",
     )
-    for event in events:
-        if "messages" in event:
-            event["messages"][-1].pretty_print()
-
-
-def main():
-    while True:
-        try:
-            user_input = input("\nUser (q to quit): ")
-            if user_input.lower() in ["exit", "q", "quit"]:
-                print("Goodbye!")
+    async for message, metadata in events:
+        if isinstance(message, AIMessageChunk) and metadata.get("langgraph_node") == "chatbot":
+            if first_token_at is None and (message.content or message.tool_call_chunks):
+                first_token_at = time.perf_counter()
+            for tool_call_chunk in message.tool_call_chunks:
+                if tool_call_chunk.get("name"):
+                    print(f"\n[Calling {tool_call_chunk['name']}]")
+                    printing_tokens = False
+            if message.content:
+                if not printing_tokens:
+                    print("\nAssistant: ", end="")
+                    printing_tokens = True
+                print(message.content, end="", flush=True)
+            if message.usage_metadata:
+                prompt_tokens.append(message.usage_metadata["input_tokens"])
+        elif isinstance(message, ToolMessage):
+            print(f"[{message.name} returned {len(str(message.content))} characters]")
+            printing_tokens = False
+
+    total = time.perf_counter() - start
+    ttft = (first_token_at - start) if first_token_at is not None else total
+    print(f"\n\n(time to first token: {ttft:.2f}s, total: {total:.2f}s)")
+    if prompt_tokens:
+        print(f"(prompt tokens: {sum(prompt_tokens)} over {len(prompt_tokens)} LLM calls, max {max(prompt_tokens)} per call)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Chat with an OpenAI model that can search the web.")
+    parser.add_argument("--thread-id", help="Resume a saved conversation. Defaults to THREAD_ID or a new ID.")
+    args = parser.parse_args()
+
+    from checkpointer import SqliteCheckpointer
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    thread_id = args.thread_id or os.getenv("THREAD_ID") or str(uuid4())
+    memory_config = {"configurable": {"thread_id": thread_id}}
+
+    # Conversations are saved to disk. Set THREAD_ID to resume a conversation.
+    memory = SqliteCheckpointer(
+        path=os.getenv("CHECKPOINT_DB", "checkpoints.sqlite"),
+        max_checkpoints=int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "5")),
+    )
+    graph = build_graph(memory)
+
+    print(f"Thread ID: {thread_id}")
+    try:
+        while True:
+            try:
+                user_input = await asyncio.to_thread(input, "\nUser (q to quit): ")
+                if user_input.lower() in ["exit", "q", "quit"]:
+                    print("Goodbye!")
+                    return None
+
+                await stream_graph_updates(graph, memory_config, user_input)
+            except Exception as e:
+                print("Error:", e)
                 return None
-
-            stream_graph_updates(user_input)
-        except Exception as e:
-            print("Error:", e)
-            return None
+    finally:
+        memory.close()
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import json
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from typing import List, Sequence, Tuple
+
+
+elided_tool_result = "[Search results removed after they were used to answer the question.]"
+
+summary_prompt = """Summarize the conversation below so it can replace the original messages.
+Keep names, facts, decisions, and open questions. Leave out greetings and search result details.
+If there is an existing summary, extend it with the new messages.
+
+Existing summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Estimate the number of prompt tokens, at roughly 4 characters per token."""
+    characters = 0
+    for message in messages:
+        characters += len(str(message.content))
+        if isinstance(message, AIMessage) and message.tool_calls:
+            characters += len(json.dumps([tool_call["args"] for tool_call in message.tool_calls]))
+    return characters // 4
+
+
+def elide_answered_tool_results(messages: Sequence[BaseMessage]) -> List[ToolMessage]:
+    """Return replacements for tool results that the LLM has already answered.
+
+    A tool result has been answered once an AI message without tool calls
+    follows it. The replacements keep the message IDs, so `add_messages`
+    swaps them in place.
+    """
+    replacements: List[ToolMessage] = []
+    answered = False
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and not message.tool_calls:
+            answered = True
+        elif answered and isinstance(message, ToolMessage) and message.content != elided_tool_result:
+            replacements.append(
+                ToolMessage(
+                    content=elided_tool_result,
+                    tool_call_id=message.tool_call_id,
+                    name=message.name,
+                    id=message.id,
+                )
+            )
+    return replacements
+
+
+def split_window(messages: Sequence[BaseMessage], max_tokens: int) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """Split messages into older messages and a recent window of at most `max_tokens`.
+
+    The window always starts at a user message, so a tool call is never
+    separated from its result. The latest user message is always kept.
+    """
+    start = len(messages)
+    tokens = 0
+    for i in range(len(messages) - 1, -1, -1):
+        tokens += estimate_tokens([messages[i]])
+        if tokens > max_tokens and start < len(messages):
+            break
+        if isinstance(messages[i], HumanMessage):
+            start = i
+    return list(messages[:start]), list(messages[start:])
+
+
+def format_for_summary(messages: Sequence[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            continue
+        if isinstance(message, AIMessage) and message.tool_calls:
+            queries = ", ".join(json.dumps(tool_call["args"]) for tool_call in message.tool_calls)
+            lines.append(f"assistant searched for: {queries}")
+        elif message.content:
+            lines.append(f"{message.type}: {message.content}")
+    return "\n".join(lines)
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+from collections import OrderedDict
+from langchain_core.tools import BaseTool, StructuredTool
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+
+SearchResults = List[Dict[str, Any]]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so that equivalent queries share a cache entry."""
+    return " ".join(query.lower().split())
+
+
+class SearchCache:
+    """In-memory TTL cache for search results, keyed on the normalized query.
+
+    Concurrent lookups for the same query share a single in-flight request.
+    Failed lookups are never cached.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Tuple[float, SearchResults]] = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def get_or_fetch(
+        self,
+        query: str,
+        fetch: Callable[[str], Awaitable[SearchResults]],
+    ) -> SearchResults:
+        key = normalize_query(query)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, results = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return results
+            del self._entries[key]
+
+        # Another tool call is already searching for this query, so wait for it.
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.hits += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(fetch(query))
+        self._in_flight[key] = task
+        try:
+            results = await asyncio.shield(task)
+        finally:
+            self._in_flight.pop(key, None)
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, results)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return results
+
+
+class TavilySearchBackend:
+    """Search the web with Tavily."""
+
+    def __init__(self, max_results: int = 2):
+        from langchain_community.tools.tavily_search import TavilySearchResults
+
+        self._tool = TavilySearchResults(max_results=max_results)
+
+    async def search(self, query: str) -> SearchResults:
+        results = await self._tool.ainvoke({"query": query})
+        # The Tavily tool reports errors as a string instead of raising.
+        if isinstance(results, str):
+            raise RuntimeError(results)
+        return results
+
+
+class StubSearchBackend:
+    """Local search backend that returns canned results after a fixed latency.
+
+    Use this for benchmarking without calling (or paying for) a search API.
+    """
+
+    def __init__(self, latency_seconds: float = 0.5, max_results: int = 2):
+        self.latency_seconds = latency_seconds
+        self.max_results = max_results
+        self.calls = 0
+
+    async def search(self, query: str) -> SearchResults:
+        self.calls += 1
+        await asyncio.sleep(self.latency_seconds)
+        return [
+            {
+                "url": f"https://example.com/search/{i}",
+                "content": f"Stub result {i} for '{query}'.",
+            }
+            for i in range(self.max_results)
+        ]
+
+
+def create_search_tool(backend, cache: SearchCache) -> BaseTool:
+    """Create the web search tool that the LLM can call."""
+
+    async def web_search(query: str) -> SearchResults:
+        return await cache.get_or_fetch(query, backend.search)
+
+    return StructuredTool.from_function(
+        coroutine=web_search,
+        name="web_search",
+        description=(
+            "A search engine optimized for comprehensive, accurate, and trusted results. "
+            "Useful for when you need to answer questions about current events. "
+            "Input should be a search query."
+        ),
+    )
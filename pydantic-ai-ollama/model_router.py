@@ -0,0 +1,298 @@
+"""Route agent runs across several model endpoints.
+
+Each endpoint is a model that Pydantic AI can run, such as an Ollama
+server or the OpenAI API. `ModelRouter.run` runs an agent with one of three
+strategies:
+
+    failover  try the endpoints in order until one succeeds
+    race      run on every endpoint at once and take the first valid answer
+    hedge     run on the first endpoint, and start a backup on the next one
+              if the first has not answered within its usual latency (a
+              percentile of its recent latencies)
+
+Race and hedge run the whole agent run on more than one endpoint. Every
+run is billed: a race costs one run per endpoint for each prompt, and a
+hedged prompt costs two runs when the backup starts. Each run also calls
+the agent's tools itself, so tools with side effects (paid APIs, writes)
+run more than once. Create the router with `side_effects=True` for such
+agents; then only failover is allowed.
+
+Endpoints that fail several times in a row are skipped for a while. Latency
+and token usage are recorded per endpoint, and can be saved between runs so
+hedging knows each endpoint's usual latency.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+@dataclass
+class Endpoint:
+    name: str
+    # A Pydantic AI model, or a model name such as "openai:gpt-4o".
+    model: Any
+
+
+@dataclass
+class EndpointStats:
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=100))
+    successes: int = 0
+    failures: int = 0
+    cancelled: int = 0
+    wins: int = 0
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+    requests: int = 0
+    request_tokens: int = 0
+    response_tokens: int = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+
+class AllEndpointsFailed(Exception):
+    def __init__(self, errors: Dict[str, BaseException]):
+        self.errors = errors
+        details = "; ".join(f"{name}: {error!r}" for name, error in errors.items())
+        super().__init__(f"Every model endpoint failed: {details}")
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        strategy: str = "failover",
+        hedge_percentile: float = 90,
+        hedge_delay: float = 1.0,
+        min_samples: int = 5,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        validate: Optional[Callable[[Any], bool]] = None,
+        side_effects: bool = False,
+    ):
+        """
+        Args:
+            endpoints: Endpoints in order of preference.
+            strategy: "failover", "race" or "hedge".
+            hedge_percentile: Start a backup request when the first endpoint
+                takes longer than this percentile of its recent latencies.
+            hedge_delay: Backup delay, in seconds, until an endpoint has
+                `min_samples` recorded latencies.
+            failure_threshold: Skip an endpoint after this many failures in a row...
+            cooldown: ...for this many seconds.
+            validate: Returns False for a result that should not be used.
+            side_effects: The agent's tools have side effects, so a prompt
+                must not run on several endpoints at once.
+        """
+        if strategy not in ("failover", "race", "hedge"):
+            raise ValueError(f"Unknown strategy: {strategy}")
+        if side_effects and strategy != "failover":
+            raise ValueError(
+                f"The {strategy} strategy runs the agent's tools on several endpoints. "
+                "This agent's tools have side effects, so use failover."
+            )
+        if not endpoints:
+            raise ValueError("At least one endpoint is required.")
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.validate = validate
+        self.stats: Dict[str, EndpointStats] = {endpoint.name: EndpointStats() for endpoint in endpoints}
+        self.hedges = 0
+
+    def _candidates(self) -> List[Endpoint]:
+        """Healthy endpoints in order. If none are healthy, all of them."""
+        healthy = [endpoint for endpoint in self.endpoints if self.stats[endpoint.name].healthy]
+        return healthy or sorted(self.endpoints, key=lambda e: self.stats[e.name].unhealthy_until)
+
+    def _backup_delay(self, endpoint: Endpoint) -> float:
+        stats = self.stats[endpoint.name]
+        if len(stats.latencies) < self.min_samples:
+            return self.hedge_delay
+        return stats.percentile(self.hedge_percentile)
+
+    async def _attempt(self, endpoint: Endpoint, agent: Any, prompt: str, kwargs: Dict[str, Any]) -> Any:
+        stats = self.stats[endpoint.name]
+        started = time.perf_counter()
+        try:
+            result = await agent.run(prompt, model=endpoint.model, **kwargs)
+            if self.validate is not None and not self.validate(result):
+                raise ValueError("Result failed validation")
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            raise
+        except Exception:
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.failure_threshold:
+                stats.unhealthy_until = time.monotonic() + self.cooldown
+            raise
+
+        stats.latencies.append(time.perf_counter() - started)
+        stats.successes += 1
+        stats.consecutive_failures = 0
+        stats.unhealthy_until = 0.0
+        usage = result.usage()
+        stats.requests += usage.requests
+        stats.request_tokens += usage.request_tokens or 0
+        stats.response_tokens += usage.response_tokens or 0
+        return result
+
+    async def run(self, agent: Any, prompt: str, **kwargs: Any) -> Any:
+        """Run `agent` on `prompt` with the router's strategy. Keyword arguments go to `agent.run`."""
+        candidates = self._candidates()
+        if self.strategy == "failover":
+            return await self._first_success(agent, prompt, kwargs, candidates, launch_all=False)
+        if self.strategy == "race":
+            return await self._first_success(agent, prompt, kwargs, candidates, launch_all=True)
+        return await self._first_success(agent, prompt, kwargs, candidates, launch_all=False, hedge=True)
+
+    async def _first_success(
+        self,
+        agent: Any,
+        prompt: str,
+        kwargs: Dict[str, Any],
+        candidates: List[Endpoint],
+        launch_all: bool,
+        hedge: bool = False,
+    ) -> Any:
+        """Start attempts until one succeeds.
+
+        A new attempt starts when every running attempt has failed, or, when
+        hedging, when the newest attempt is slower than its backup delay.
+        """
+        waiting = list(candidates)
+        running: Dict[asyncio.Task, Endpoint] = {}
+        errors: Dict[str, BaseException] = {}
+
+        def launch():
+            endpoint = waiting.pop(0)
+            task = asyncio.create_task(self._attempt(endpoint, agent, prompt, kwargs))
+            running[task] = endpoint
+            return endpoint
+
+        try:
+            newest = launch()
+            while launch_all and waiting:
+                launch()
+
+            while running:
+                timeout = self._backup_delay(newest) if hedge and waiting else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # The newest attempt is slower than usual: hedge on the next endpoint.
+                    self.hedges += 1
+                    newest = launch()
+                    continue
+
+                for task in done:
+                    endpoint = running.pop(task)
+                    if task.exception() is None:
+                        self.stats[endpoint.name].wins += 1
+                        return task.result()
+                    errors[endpoint.name] = task.exception()
+
+                if not running and waiting:
+                    newest = launch()
+
+            raise AllEndpointsFailed(errors)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    def report(self) -> str:
+        lines = [f"Model router ({self.strategy}, {self.hedges} hedged requests):"]
+        for endpoint in self.endpoints:
+            stats = self.stats[endpoint.name]
+            p50 = stats.percentile(50)
+            p95 = stats.percentile(95)
+            latency = f"p50 {p50:.2f}s, p95 {p95:.2f}s" if p50 is not None else "no latencies"
+            lines.append(
+                f"\t- {endpoint.name}: {stats.wins} wins, {stats.successes} ok, {stats.failures} failed, "
+                f"{stats.cancelled} cancelled, {latency}, {stats.requests} requests, "
+                f"{stats.request_tokens} request / {stats.response_tokens} response tokens"
+                + ("" if stats.healthy else ", unhealthy")
+            )
+        return "\n".join(lines)
+
+    def load(self, path: str):
+        """Load recorded latencies, so hedging knows each endpoint's usual latency."""
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            saved = json.load(f)
+        for name, latencies in saved.items():
+            if name in self.stats:
+                self.stats[name].latencies.extend(latencies)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({name: list(stats.latencies) for name, stats in self.stats.items()}, f)
+
+
+def parse_endpoints(spec: str) -> List[Endpoint]:
+    """Parse endpoints like "local=llama3.2@http://localhost:11434/v1,cloud=openai:gpt-4o-mini".
+
+    Each endpoint is `[name=]model[@base_url]`. Endpoints with a base URL are
+    OpenAI-compatible servers such as Ollama. Endpoints without one are
+    Pydantic AI model names.
+    """
+    from pydantic_ai.models.openai import OpenAIModel
+
+    endpoints = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, target = item.rpartition("=")
+        model_name, _, base_url = target.partition("@")
+        if base_url:
+            # Local servers don't check the API key. Don't send the real one to them.
+            model = OpenAIModel(model_name=model_name, base_url=base_url, api_key="not-set")
+        else:
+            model = model_name
+        endpoints.append(Endpoint(name=name or target, model=model))
+    return endpoints
+
+
+def router_from_env(side_effects: bool = False) -> Optional[ModelRouter]:
+    """Create a router from MODEL_ENDPOINTS, or return None if it is not set.
+
+    MODEL_ROUTING is the strategy ("failover", "race" or "hedge") and
+    HEDGE_PERCENTILE the latency percentile that triggers a backup request.
+    Latencies are kept in MODEL_ROUTER_STATS between runs. See `ModelRouter`
+    for `side_effects`.
+    """
+    spec = os.getenv("MODEL_ENDPOINTS")
+    if not spec:
+        return None
+    router = ModelRouter(
+        parse_endpoints(spec),
+        strategy=os.getenv("MODEL_ROUTING", "failover"),
+        hedge_percentile=float(os.getenv("HEDGE_PERCENTILE", "90")),
+        hedge_delay=float(os.getenv("HEDGE_DELAY", "1.0")),
+        side_effects=side_effects,
+    )
+    router.load(os.getenv("MODEL_ROUTER_STATS", ".model_router_stats.json"))
+    return router
@@ -1,46 +1,66 @@
 import asyncio
-import logfire
 import os
 import sys
 
-from devtools import debug
-from dotenv import load_dotenv
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel
 
+# Heavy packages (Pydantic AI, logfire) are imported when the agent is built
+# rather than at import time, so usage errors are reported quickly.
 
-load_dotenv(verbose=True)
 
-# Send logs only if LOGFIRE_TOKEN is environment variable is set.
-logfire.configure(send_to_logfire="if-token-present")
+def get_agent():
+    """Configure logging and create the agent."""
+    import logfire
 
-llm_model = os.getenv("LLM_MODEL", "llama3.2")
-ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434/v1")
+    from pydantic_ai import Agent
+    from pydantic_ai.models.openai import OpenAIModel
 
-model = OpenAIModel(
-    model_name=llm_model,
-    base_url=ollama_host,
-)
+    # Send logs only if LOGFIRE_TOKEN is environment variable is set.
+    logfire.configure(send_to_logfire="if-token-present")
 
-agent = Agent(model=model)
+    llm_model = os.getenv("LLM_MODEL", "llama3.2")
+    ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434/v1")
 
-try:
-    prompt = sys.argv[1]
-except IndexError:
-    print("\nusage: python ollama_example.py <prompt>\n")
-    sys.exit(1)
+    model = OpenAIModel(
+        model_name=llm_model,
+        base_url=ollama_host,
+    )
+
+    return Agent(model=model)
 
 
 async def main():
+    try:
+        prompt = sys.argv[1]
+    except IndexError:
+        print("\nusage: python ollama_example.py <prompt>\n")
+        sys.exit(1)
+
+    from dotenv import load_dotenv
+
+    load_dotenv(verbose=True)
+    agent = get_agent()
+
+    # With MODEL_ENDPOINTS set, the prompt goes to several models.
+    from model_router import router_from_env
+
+    router = router_from_env()
+
     print(f"User prompt: {prompt}")
     print(f"\n========================================\n")
 
-    response = await agent.run(prompt)
+    if router:
+        response = await router.run(agent, prompt)
+    else:
+        response = await agent.run(prompt)
     print(response.data)
 
     print(f"\n========================================\n")
     print(f"Usage: {response.usage()}\n")
 
+    if router:
+        print(router.report())
+        router.save(os.getenv("MODEL_ROUTER_STATS", ".model_router_stats.json"))
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,106 @@
+"""A stub OpenAI-compatible chat completions server, for trying the model router.
+
+It answers every chat completion with a short text reply after a configurable
+delay, and fails a configurable fraction of requests. Run two of them with
+different latencies and point MODEL_ENDPOINTS at both:
+
+    python stub_model_server.py --port 8101 --latency 0.2 --slow-rate 0.2 --slow-latency 3
+    python stub_model_server.py --port 8102 --latency 0.5 --fail-rate 0.1
+    MODEL_ENDPOINTS="a=stub@http://127.0.0.1:8101/v1,b=stub@http://127.0.0.1:8102/v1" \\
+        MODEL_ROUTING=hedge python ollama_example.py "Hello"
+
+It only uses the standard library.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float, slow_rate: float, slow_latency: float, fail_rate: float, seed: int):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubModelServer
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        with self.server.lock:
+            self.server.requests += 1
+            number = self.server.requests
+            slow = self.server.random.random() < self.server.slow_rate
+            fail = self.server.random.random() < self.server.fail_rate
+
+        time.sleep(self.server.slow_latency if slow else self.server.latency)
+        if fail:
+            self._send_json(500, {"error": {"message": "Stub failure", "type": "server_error"}})
+            return
+
+        prompt = " ".join(str(message.get("content") or "") for message in body.get("messages", []))
+        content = f"Stub answer {number} from port {self.server.server_address[1]}."
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        self._send_json(200, {
+            "id": f"chatcmpl-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before each response.")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of responses that are slow.")
+    parser.add_argument("--slow-latency", type=float, default=3.0, help="Seconds before a slow response.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests that fail with a 500.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubModelServer(
+        (args.host, args.port), args.latency, args.slow_rate, args.slow_latency, args.fail_rate, args.seed
+    )
+    print(f"Stub model server on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,28 @@
 import asyncio
+import functools
 import json
 import os
 import sys
 
 from dataclasses import dataclass
-from devtools import debug
-from dotenv import load_dotenv
-from httpx import AsyncClient as AsyncHttpxClient
-from pydantic_ai import Agent, ModelRetry, RunContext
-from pydantic_ai.models.openai import OpenAIModel
-from typing import Any, Literal
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Literal
 
+if TYPE_CHECKING:
+    from httpx import AsyncClient as AsyncHttpxClient
+
+
+# Heavy packages (Pydantic AI, httpx, logfire) are imported when the agent is built
+# rather than at import time, so usage errors are reported quickly.
+
+project_dir = Path(__file__).parent
 
-load_dotenv()
 
 @dataclass
 class WeatherDeps:
     """Dependencies for the weather agent."""
 
-    httpx_client: AsyncHttpxClient
+    httpx_client: "AsyncHttpxClient"
     geocode_api_key: str
     geocode_endpoint: str
     weather_api_key: str
@@ -34,127 +38,147 @@ class LatLon:
     lon: float
 
 
-# Read the system prompt.
-with open("system_prompt.md") as f:
-    system_prompt = f.read()
+@functools.cache
+def load_weather_codes() -> Dict[str, Any]:
+    """Read weather codes from JSON source."""
+    with open(project_dir / "weather_codes.json") as f:
+        return json.load(f)
 
-# Read weather codes from JSON source.
-with open("weather_codes.json") as f:
-    weather_codes = json.load(f)
 
-llm_model = os.getenv("LLM_MODEL")
-if not llm_model:
-    raise ValueError("LLM_MODEL environment variable is required.")
+def get_model():
+    """Get the model to use from the environment."""
+    llm_model = os.getenv("LLM_MODEL")
+    if not llm_model:
+        raise ValueError("LLM_MODEL environment variable is required.")
+
+    # If an OpenAI API key is set, then we will use OpenAI.
+    # Otherwise, use Ollama running locally.
+    if os.getenv("OPENAI_API_KEY"):
+        print(f"\nUsing OpenAI with {llm_model}.")
+        return llm_model
+
+    from pydantic_ai.models.openai import OpenAIModel
 
-# If an OpenAI API key is set, then we will use OpenAI.
-# Otherwise, use Ollama running locally.
-if os.getenv("OPENAI_API_KEY"):
-    print(f"\nUsing OpenAI with {llm_model}.")
-    model = llm_model
-else:
     ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434/v1")
     print(f"\nUsing Ollama at {ollama_host} with {llm_model}.")
-    model = OpenAIModel(
+    return OpenAIModel(
         model_name=llm_model,
         base_url=ollama_host,
     )
 
-# Create the weather agent.
-weather_agent = Agent(
-    model=model,
-    system_prompt=system_prompt,
-    deps_type=WeatherDeps,
-    retries=2,
-)
 
+@functools.cache
+def get_weather_agent():
+    """Create the weather agent and register its tools."""
+    import logfire
 
-@weather_agent.tool
-async def get_lat_lon(c: RunContext[WeatherDeps], address: str) -> LatLon:
-    """Get the latitude and longitude of an address.
+    from pydantic_ai import Agent, ModelRetry, RunContext
 
-    This function is registered as a tool for the weather agent.
+    # Send traces only if the LOGFIRE_TOKEN environment variable is set.
+    logfire.configure(send_to_logfire="if-token-present")
 
-    Args:
-        c: Run context.
-        address: The address or description of a location.
-    """
+    # Read the system prompt.
+    with open(project_dir / "system_prompt.md") as f:
+        system_prompt = f.read()
 
-    # TODO: Look for the lat/lon in a local cache before making API call.
+    weather_agent = Agent(
+        model=get_model(),
+        system_prompt=system_prompt,
+        deps_type=WeatherDeps,
+        retries=2,
+    )
 
-    if c.deps.geocode_api_key is None:
-        raise ValueError("Geocode API key is required.")
+    @weather_agent.tool
+    async def get_lat_lon(c: RunContext[WeatherDeps], address: str) -> LatLon:
+        """Get the latitude and longitude of an address.
 
-    query_params = {
-        "q": address,
-        "api_key": c.deps.geocode_api_key,
-    }
+        This function is registered as a tool for the weather agent.
 
-    response = await c.deps.httpx_client.get(c.deps.geocode_endpoint, params=query_params)
-    response.raise_for_status()
-    data = response.json()
+        Args:
+            c: Run context.
+            address: The address or description of a location.
+        """
 
-    # TODO: Cache this result locally.
+        # TODO: Look for the lat/lon in a local cache before making API call.
 
-    if data:
-        result = LatLon(lat=data[0]["lat"], lon=data[0]["lon"])
-        print(f"{address} => {result.lat}, {result.lon}")
-        return result
-    else:
-        raise ModelRetry(f"Could not find lat/lon for address '{address}'.")
+        if c.deps.geocode_api_key is None:
+            raise ValueError("Geocode API key is required.")
 
+        query_params = {
+            "q": address,
+            "api_key": c.deps.geocode_api_key,
+        }
 
-@weather_agent.tool
-async def get_weather(c: RunContext[WeatherDeps], lat: float, lon: float) -> Any:
-    """Get the current weather at a given latitude and longitude.
+        with logfire.span("geocode {address}", address=address) as span:
+            response = await c.deps.httpx_client.get(c.deps.geocode_endpoint, params=query_params)
+            response.raise_for_status()
+            data = response.json()
+            span.set_attribute("results", len(data))
 
-    This function is registered as a tool for the weather agent.
+        # TODO: Cache this result locally.
 
-    Args:
-        c: Run context.
-        lat: Location latitude.
-        lon: Location longitude.
-    """
+        if data:
+            result = LatLon(lat=data[0]["lat"], lon=data[0]["lon"])
+            logfire.info("{address} => {lat}, {lon}", address=address, lat=result.lat, lon=result.lon)
+            return result
+        else:
+            raise ModelRetry(f"Could not find lat/lon for address '{address}'.")
 
-    # TODO: Look for the weather data in a local cache before making API call.
+    @weather_agent.tool
+    async def get_weather(c: RunContext[WeatherDeps], lat: float, lon: float) -> Any:
+        """Get the current weather at a given latitude and longitude.
 
-    if c.deps.weather_api_key is None:
-        raise ValueError("Weather API key is required.")
+        This function is registered as a tool for the weather agent.
 
-    params = {
-        "apikey": c.deps.weather_api_key,
-        "location": f"{lat}, {lon}",
-        "units": c.deps.weather_units,
-    }
+        Args:
+            c: Run context.
+            lat: Location latitude.
+            lon: Location longitude.
+        """
 
-    response = await c.deps.httpx_client.get(c.deps.weather_endpoint, params=params)
-    response.raise_for_status()
-    data = response.json()
-    # debug(data)
+        # TODO: Look for the weather data in a local cache before making API call.
 
-    # TODO: Cache this result locally.
+        if c.deps.weather_api_key is None:
+            raise ValueError("Weather API key is required.")
 
-    return data["data"]["values"]
+        params = {
+            "apikey": c.deps.weather_api_key,
+            "location": f"{lat}, {lon}",
+            "units": c.deps.weather_units,
+        }
 
+        with logfire.span("weather {lat}, {lon}", lat=lat, lon=lon, units=c.deps.weather_units):
+            response = await c.deps.httpx_client.get(c.deps.weather_endpoint, params=params)
+            response.raise_for_status()
+            data = response.json()
+        # debug(data)
 
-@weather_agent.tool
-def lookup_weather_code(c: RunContext[WeatherDeps], weather_code: int) -> str:
-    """Lookup the friendly text description for a weather code.
+        # TODO: Cache this result locally.
 
-    This function is registered as a tool for the weather agent. The weather
-    code is returned by the get_weather tool as `weatherCode`.
+        return data["data"]["values"]
 
-    Example:
-        lookup_weather_code(context, 1000) -> "Clear, Sunny"
+    @weather_agent.tool
+    def lookup_weather_code(c: RunContext[WeatherDeps], weather_code: int) -> str:
+        """Lookup the friendly text description for a weather code.
 
-    Args:
-        c: Run context.
-        weather_code: Weather code to lookup.
-    """
+        This function is registered as a tool for the weather agent. The weather
+        code is returned by the get_weather tool as `weatherCode`.
 
-    weather_code_text = weather_codes.get("weatherCode", {}).get(str(weather_code), "Unknown")
-    print(f"weather code {weather_code} => {weather_code_text}")
+        Example:
+            lookup_weather_code(context, 1000) -> "Clear, Sunny"
 
-    return weather_code_text
+        Args:
+            c: Run context.
+            weather_code: Weather code to lookup.
+        """
+
+        weather_codes = load_weather_codes()
+        weather_code_text = weather_codes.get("weatherCode", {}).get(str(weather_code), "Unknown")
+        logfire.info("weather code {weather_code} => {text}", weather_code=weather_code, text=weather_code_text)
+
+        return weather_code_text
+
+    return weather_agent
 
 
 async def main():
@@ -165,6 +189,12 @@ async def main():
         print("\nusage: python weather_agent.py <location>\n")
         return sys.exit(1)
 
+    from dotenv import load_dotenv
+    from httpx import AsyncClient as AsyncHttpxClient
+
+    load_dotenv()
+    weather_agent = get_weather_agent()
+
     async with AsyncHttpxClient() as client:
         deps = WeatherDeps(
             httpx_client=client,